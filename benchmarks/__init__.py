@@ -0,0 +1,6 @@
+"""
+Benchmarks of the :class:`tornado_fastrpc.client.ServerProxy`. They are
+not part of the installed package, run them from the repository root::
+
+    python -m benchmarks.transport
+"""
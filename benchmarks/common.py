@@ -0,0 +1,63 @@
+"""
+Helpers for measuring throughput and latency of the RPC calls.
+"""
+
+import time
+
+import tornado.gen
+
+__all__ = ['make_payload', 'measure', 'percentile']
+
+
+def make_payload(size):
+    """
+    Return list of strings with approximately *size* bytes of data.
+    """
+    item = 'x' * 64
+    return [item] * max(1, size // len(item))
+
+
+def percentile(values, p):
+    """
+    Return *p*-th percentile (0-100) of sorted *values*.
+    """
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+@tornado.gen.coroutine
+def measure(proxy, payload, concurrency, calls, method='echo'):
+    """
+    Issue *calls* calls of the *method* with *payload* using *concurrency*
+    parallel workers. Return dict with throughput and latency percentiles
+    in milliseconds.
+    """
+    latencies = []
+    errors = [0]
+    remaining = [calls]
+
+    @tornado.gen.coroutine
+    def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.time()
+            res = yield proxy.call_func(method, payload, quiet=True)
+            latencies.append(time.time() - start)
+            if not res.success:
+                errors[0] += 1
+
+    start = time.time()
+    yield [worker() for _ in range(concurrency)]
+    elapsed = time.time() - start
+
+    latencies.sort()
+    return_value = {
+        'calls': calls,
+        'errors': errors[0],
+        'calls_per_second': calls / elapsed,
+    }
+    for name, p in (('p50', 50), ('p99', 99), ('p999', 99.9)):
+        return_value[name + '_ms'] = percentile(latencies, p) * 1000.0
+    raise tornado.gen.Return(return_value)
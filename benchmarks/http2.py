@@ -0,0 +1,83 @@
+"""
+Compare HTTP/2 multiplexing with HTTP/1.x modes of the curl transport.
+
+Echo server of the benchmarks supports only HTTP/1.x, HTTP/2 modes need
+server given by ``--uri``, which supports HTTP/1.x and HTTP/2 with prior
+knowledge (e.g. nginx with ``http2 on``)::
+
+    python -m benchmarks.http2 --uri http://127.0.0.1:8080/RPC2 \\
+        --concurrency 200 --max-streams 10,100
+"""
+
+import argparse
+import json
+import sys
+
+import tornado.ioloop
+
+from tornado_fastrpc.client import ServerProxy
+from tornado_fastrpc.share import CurlShare
+
+from benchmarks.common import make_payload, measure
+from benchmarks.server import spawn_server
+
+
+def _int_list(value):
+    return [int(i) for i in value.split(',')]
+
+
+def get_modes(args):
+    modes = [
+        ('http1.0', {'http_version': '1.0'}),
+        ('http1.0-keep-alive', {'http_version': '1.0', 'keep_alive': True}),
+        ('http1.1-keep-alive', {'http_version': '1.1', 'keep_alive': True}),
+    ]
+    for max_streams in args.max_streams:
+        modes.append(('http2-streams-{}'.format(max_streams),
+                      {'http_version': '2', 'max_streams': max_streams}))
+    return modes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--uri', help="server supporting HTTP/1.x and h2c, "
+                                      "HTTP/2 modes are skipped without it")
+    parser.add_argument('--calls', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--payload', type=int, default=100,
+                        help="payload size in bytes")
+    parser.add_argument('--max-streams', type=_int_list, default=[100],
+                        help="comma separated streams per connection")
+    args = parser.parse_args()
+
+    process = None
+    uri = args.uri
+    if uri is None:
+        process, uri = spawn_server()
+    payload = make_payload(args.payload)
+    try:
+        for name, options in get_modes(args):
+            if options['http_version'] == '2' and process is not None:
+                sys.stderr.write("Skipping {}, --uri is required\n".format(
+                    name))
+                continue
+            share = CurlShare()
+            proxy = ServerProxy(uri, max_clients=args.concurrency,
+                                curl_share=share, **options)
+            io_loop = tornado.ioloop.IOLoop.current()
+            # Warm up, so the first connections don't distort the results
+            io_loop.run_sync(lambda: measure(
+                proxy, payload, args.concurrency, min(args.calls, 100)))
+            result = io_loop.run_sync(lambda: measure(
+                proxy, payload, args.concurrency, args.calls))
+            result['mode'] = name
+            result['connections'] = share.connections
+            proxy._http_client.close()
+            print(json.dumps(result, sort_keys=True))
+    finally:
+        if process is not None:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()
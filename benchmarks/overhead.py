@@ -0,0 +1,113 @@
+"""
+Measure per-call overhead of the proxy API without network, HTTP client
+returns prepared response immediately.
+
+::
+
+    python -m benchmarks.overhead --calls 20000
+"""
+
+import argparse
+import io
+import json
+import time
+
+import tornado.concurrent
+import tornado.gen
+import tornado.httpclient
+import tornado.ioloop
+
+from tornado_fastrpc.aio import AsyncServerProxy
+from tornado_fastrpc.client import Result, ServerProxy
+
+RESPONSE = (b"<?xml version='1.0'?>\n<methodResponse>\n<params>\n<param>\n"
+            b"<value><int>1</int></value>\n</param>\n</params>\n"
+            b"</methodResponse>\n")
+
+
+class StubHTTPClient(object):
+
+    def __init__(self, max_clients=10):
+        self.max_clients = max_clients
+
+    def fetch(self, request):
+        future = tornado.concurrent.Future()
+        future.set_result(tornado.httpclient.HTTPResponse(
+            request, 200, buffer=io.BytesIO(RESPONSE)))
+        return future
+
+
+class BaselineProxy(ServerProxy):
+    """
+    Proxy with call_func of the first release, which only sent the request
+    and decoded the response.
+    """
+
+    @tornado.gen.coroutine
+    def call_func(self, name, *args, **kwargs):
+        quiet = kwargs.pop('quiet', False)
+        try:
+            request = self._get_request(name, args)
+            response = yield self._http_client.fetch(request)
+            result_data = self._process_rpc_response(response)
+        except Exception as e:
+            if quiet:
+                raise tornado.gen.Return(Result(False, None, e))
+            else:
+                raise
+        else:
+            raise tornado.gen.Return(Result(True, result_data, None))
+
+
+def get_cases():
+    baseline = BaselineProxy('http://example.com/RPC2',
+                             http_client_cls=StubHTTPClient)
+    proxy = ServerProxy('http://example.com/RPC2',
+                        http_client_cls=StubHTTPClient)
+    async_proxy = AsyncServerProxy('http://example.com/RPC2',
+                                   http_client_cls=StubHTTPClient)
+    return [
+        # Difference to the baseline is overhead of the features (limiter,
+        # balancer) and of the API
+        ('baseline',
+         lambda: baseline.call_func('catalog.getItem', 1)),
+        ('ServerProxy.call_func',
+         lambda: proxy.call_func('catalog.getItem', 1)),
+        ('ServerProxy.catalog.getItem',
+         lambda: proxy.catalog.getItem(1)),
+        ('AsyncServerProxy.call_func',
+         lambda: async_proxy.call_func('catalog.getItem', 1)),
+        ('AsyncServerProxy.catalog.getItem',
+         lambda: async_proxy.catalog.getItem(1)),
+    ]
+
+
+async def measure(call, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        await call()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="the best of repeated runs is reported")
+    args = parser.parse_args()
+
+    io_loop = tornado.ioloop.IOLoop.current()
+    for name, call in get_cases():
+        # Warm up
+        io_loop.run_sync(lambda: measure(call, min(args.calls, 1000)))
+        elapsed = min(io_loop.run_sync(lambda: measure(call, args.calls))
+                      for _ in range(args.repeat))
+        print(json.dumps({
+            'api': name,
+            'calls': args.calls,
+            'us_per_call': elapsed / args.calls * 1e6,
+        }, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
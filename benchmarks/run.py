@@ -0,0 +1,125 @@
+"""
+Benchmark ServerProxy over a matrix of options, payload sizes and
+concurrency levels.
+
+::
+
+    python -m benchmarks.run --output new.json
+    python -m benchmarks.run --output new.json --compare old.json
+
+Results are written as JSON, every case contains its parameters, calls/s
+and p50/p99/p999 latency in milliseconds. ``--compare`` prints relative
+change of calls/s and p99 latency against results of another run.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+
+try:
+    import fastrpc
+except ImportError:
+    fastrpc = None
+import tornado
+import tornado.ioloop
+
+import tornado_fastrpc
+from tornado_fastrpc.client import ServerProxy
+
+from benchmarks.common import make_payload, measure
+from benchmarks.server import spawn_server
+
+OPTIONS = ('use_http10', 'keep_alive', 'use_binary', 'max_clients')
+PARAMS = OPTIONS + ('payload', 'concurrency')
+
+
+def _int_list(value):
+    return [int(i) for i in value.split(',')]
+
+
+def get_cases(args):
+    use_binary = [False, True] if fastrpc is not None else [False]
+    for values in itertools.product([True, False], [False, True],
+                                    use_binary, args.max_clients,
+                                    args.payload, args.concurrency):
+        yield dict(zip(PARAMS, values))
+
+
+def run_case(uri, case, calls):
+    options = dict((k, case[k]) for k in OPTIONS)
+    proxy = ServerProxy(uri, **options)
+    payload = make_payload(case['payload'])
+    io_loop = tornado.ioloop.IOLoop.current()
+    # Warm up, so the first connections don't distort the results
+    io_loop.run_sync(lambda: measure(
+        proxy, payload, case['concurrency'], min(calls, 100)))
+    result = io_loop.run_sync(lambda: measure(
+        proxy, payload, case['concurrency'], calls))
+    proxy._http_client.close()
+    result.update(case)
+    return result
+
+
+def case_key(case):
+    return tuple(case[k] for k in PARAMS)
+
+
+def compare(old, new):
+    old_results = dict((case_key(r), r) for r in old['results'])
+    print("{:<90} {:>10} {:>10}".format("case", "calls/s", "p99"))
+    for result in new['results']:
+        base = old_results.get(case_key(result))
+        if base is None:
+            continue
+        name = ' '.join('{}={}'.format(k, result[k]) for k in PARAMS)
+        print("{:<90} {:>+9.1f}% {:>+9.1f}%".format(
+            name,
+            (result['calls_per_second'] / base['calls_per_second'] - 1) * 100,
+            (result['p99_ms'] / base['p99_ms'] - 1) * 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calls', type=int, default=2000,
+                        help="number of calls per case")
+    parser.add_argument('--payload', type=_int_list, default=[100, 10000],
+                        help="comma separated payload sizes in bytes")
+    parser.add_argument('--concurrency', type=_int_list, default=[1, 10],
+                        help="comma separated numbers of parallel callers")
+    parser.add_argument('--max-clients', type=_int_list, default=[10],
+                        help="comma separated sizes of the connection pool")
+    parser.add_argument('--output', help="write JSON results to file")
+    parser.add_argument('--compare', help="JSON results of previous run")
+    args = parser.parse_args()
+
+    process, uri = spawn_server()
+    results = []
+    try:
+        for case in get_cases(args):
+            result = run_case(uri, case, args.calls)
+            sys.stderr.write(json.dumps(result, sort_keys=True) + '\n')
+            results.append(result)
+    finally:
+        process.terminate()
+
+    report = {
+        'version': tornado_fastrpc.version,
+        'tornado': tornado.version,
+        'python': platform.python_version(),
+        'fastrpc': fastrpc is not None,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Local XML-RPC/FastRPC echo server used by benchmarks. Every method returns
+its first argument.
+
+::
+
+    python -m benchmarks.server --port 8000
+"""
+
+import argparse
+import multiprocessing
+import xmlrpc.client as xmlrpclib
+
+try:
+    import fastrpc
+except ImportError:
+    fastrpc = None
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.web
+
+__all__ = ['EchoHandler', 'make_app', 'spawn_server']
+
+
+class EchoHandler(tornado.web.RequestHandler):
+
+    def post(self):
+        content_type = self.request.headers.get('Content-Type', 'text/xml')
+        if content_type == 'application/x-frpc' and fastrpc is not None:
+            params, name = fastrpc.loads(self.request.body)
+            body = fastrpc.dumps((params[0] if params else None,),
+                                 methodresponse=True, useBinary=True)
+        else:
+            params, name = xmlrpclib.loads(self.request.body)
+            body = xmlrpclib.dumps((params[0] if params else None,),
+                                   methodresponse=True, allow_none=True)
+            content_type = 'text/xml'
+        self.set_header('Content-Type', content_type)
+        self.write(body)
+
+
+def make_app():
+    return tornado.web.Application([(r'/RPC2', EchoHandler)])
+
+
+def _serve(sockets, ready):
+    server = tornado.httpserver.HTTPServer(make_app())
+    server.add_sockets(sockets)
+    tornado.ioloop.IOLoop.current().add_callback(ready.set)
+    tornado.ioloop.IOLoop.current().start()
+
+
+def spawn_server(address='127.0.0.1', unix_socket=None):
+    """
+    Start echo server in a subprocess, so it doesn't share the CPU with
+    the benchmarked client. Server listens on *unix_socket* path if it's
+    given. Return tuple *(process, uri)*.
+    """
+    if unix_socket is not None:
+        sockets = [tornado.netutil.bind_unix_socket(unix_socket)]
+        uri = 'unix://' + unix_socket
+    else:
+        sockets = tornado.netutil.bind_sockets(0, address)
+        uri = 'http://{}:{}/RPC2'.format(address,
+                                         sockets[0].getsockname()[1])
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=_serve, args=(sockets, ready))
+    process.daemon = True
+    process.start()
+    for sock in sockets:
+        sock.close()
+    ready.wait()
+    return process, uri
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    make_app().listen(args.port, args.address)
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == '__main__':
+    main()
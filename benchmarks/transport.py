@@ -0,0 +1,49 @@
+"""
+Compare latency of the curl transport with the asyncio transport.
+
+::
+
+    python -m benchmarks.transport --calls 5000 --concurrency 10
+"""
+
+import argparse
+import json
+
+import tornado.ioloop
+
+from tornado_fastrpc.client import ServerProxy
+from tornado_fastrpc.transport import AsyncioHTTPClient
+
+from benchmarks.common import make_payload, measure
+from benchmarks.server import spawn_server
+
+TRANSPORTS = [
+    ('curl', {}),
+    ('curl-keep-alive', {'keep_alive': True, 'use_http10': False}),
+    ('asyncio', {'http_client_cls': AsyncioHTTPClient}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calls', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--payload', type=int, default=100,
+                        help="payload size in bytes")
+    args = parser.parse_args()
+
+    process, uri = spawn_server()
+    payload = make_payload(args.payload)
+    try:
+        for name, options in TRANSPORTS:
+            proxy = ServerProxy(uri, max_clients=args.concurrency, **options)
+            result = tornado.ioloop.IOLoop.current().run_sync(
+                lambda: measure(proxy, payload, args.concurrency, args.calls))
+            result['transport'] = name
+            print(json.dumps(result, sort_keys=True))
+    finally:
+        process.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare latency of the Unix socket transport with loopback TCP.
+
+::
+
+    python -m benchmarks.unix --calls 5000 --concurrency 10
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import tornado.ioloop
+
+from tornado_fastrpc.client import ServerProxy
+from tornado_fastrpc.transport import AsyncioHTTPClient
+
+from benchmarks.common import make_payload, measure
+from benchmarks.server import spawn_server
+
+TRANSPORTS = [
+    ('curl', {}),
+    ('curl-keep-alive', {'keep_alive': True}),
+    ('asyncio', {'http_client_cls': AsyncioHTTPClient}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calls', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--payload', type=int, default=100,
+                        help="payload size in bytes")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    tcp_process, tcp_uri = spawn_server()
+    unix_process, unix_uri = spawn_server(
+        unix_socket=os.path.join(directory, 'rpc.sock'))
+    payload = make_payload(args.payload)
+    io_loop = tornado.ioloop.IOLoop.current()
+    try:
+        for name, options in TRANSPORTS:
+            for socket, uri in (('tcp', tcp_uri), ('unix', unix_uri)):
+                proxy = ServerProxy(uri, max_clients=args.concurrency,
+                                    **options)
+                # Warm up, so the first connections don't distort the
+                # results
+                io_loop.run_sync(lambda: measure(
+                    proxy, payload, args.concurrency, min(args.calls, 100)))
+                result = io_loop.run_sync(lambda: measure(
+                    proxy, payload, args.concurrency, args.calls))
+                proxy._http_client.close()
+                result['transport'] = name
+                result['socket'] = socket
+                print(json.dumps(result, sort_keys=True))
+    finally:
+        tcp_process.terminate()
+        unix_process.terminate()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
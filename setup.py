@@ -88,7 +88,7 @@ setup(
     zip_safe=True,
     install_requires=[
         'setuptools>=0.6b1',
-        'tornado>=3.2',
+        'tornado>=4.1',
         'pycurl',
     ],
     extras_require={
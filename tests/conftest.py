@@ -0,0 +1,62 @@
+import functools
+import io
+
+import pytest
+import tornado.concurrent
+import tornado.gen
+import tornado.httpclient
+import tornado.ioloop
+
+XML_RESPONSE = (
+    "<?xml version='1.0'?>\n"
+    "<methodResponse>\n"
+    "<params>\n"
+    "<param>\n"
+    "<value><int>{}</int></value>\n"
+    "</param>\n"
+    "</params>\n"
+    "</methodResponse>\n"
+)
+
+
+@pytest.fixture(scope='function')
+def run_sync():
+    io_loop = tornado.ioloop.IOLoop()
+
+    def run(func, *args, **kwargs):
+        return io_loop.run_sync(functools.partial(func, *args, **kwargs))
+
+    yield run
+    io_loop.close(all_fds=True)
+
+
+def make_response(request, body=b'', code=200, headers=None, time_info=None):
+    if not isinstance(body, bytes):
+        body = body.encode('utf-8')
+    response = tornado.httpclient.HTTPResponse(
+        request, code, headers=headers, buffer=io.BytesIO(body),
+        request_time=0.001, time_info=time_info)
+    if response.error:
+        raise response.error
+    return response
+
+
+class FakeHTTPClient(object):
+    """
+    Replaces CurlAsyncHTTPClient, *handler* is called with the request
+    and returns response body, response or future, or raises an exception.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+
+    @tornado.gen.coroutine
+    def fetch(self, request):
+        self.requests.append(request)
+        result = self.handler(request)
+        if tornado.concurrent.is_future(result):
+            result = yield result
+        if isinstance(result, tornado.httpclient.HTTPResponse):
+            raise tornado.gen.Return(result)
+        raise tornado.gen.Return(make_response(request, result))
@@ -0,0 +1,146 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import asyncio
+import time
+
+import mock
+import pytest
+import tornado.concurrent
+import tornado.httpclient
+import tornado.ioloop
+
+from tornado_fastrpc.aio import AsyncMethod, AsyncServerProxy
+from tornado_fastrpc.client import Fault, Result
+from tornado_fastrpc.limiter import DeadlineExceeded
+
+from .conftest import XML_RESPONSE, FakeHTTPClient
+
+XML_FAULT = (
+    "<?xml version='1.0'?>\n"
+    "<methodResponse>\n"
+    "<fault>\n"
+    "<value><struct>\n"
+    "<member><name>faultCode</name><value><int>-1</int></value></member>\n"
+    "<member><name>faultString</name><value><string>Error</string>"
+    "</value></member>\n"
+    "</struct></value>\n"
+    "</fault>\n"
+    "</methodResponse>\n"
+)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def make_proxy(handler):
+    proxy = AsyncServerProxy('http://example.com/RPC2')
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(handler)
+    return proxy
+
+
+def test_call_func(loop):
+    proxy = make_proxy(lambda request: XML_RESPONSE.format(1))
+    res = loop.run_until_complete(proxy.call_func('getData', 'x'))
+    assert res == Result(True, 1, None)
+    assert xmlrpclib.loads(proxy._http_client_inst.requests[0].body) == \
+        (('x',), 'getData')
+
+
+def test_call_func_fault(loop):
+    proxy = make_proxy(lambda request: XML_FAULT)
+    with pytest.raises(Fault):
+        loop.run_until_complete(proxy.call_func('getData'))
+    res = loop.run_until_complete(proxy.call_func('getData', quiet=True))
+    assert res.success is False
+    assert isinstance(res.exception, Fault)
+
+
+def test_call_func_unexpected_kwarg(loop):
+    proxy = make_proxy(lambda request: XML_RESPONSE.format(1))
+    with pytest.raises(TypeError):
+        loop.run_until_complete(proxy.call_func('getData', foo=1))
+
+
+def test_methods_are_cached(loop):
+    proxy = make_proxy(lambda request: XML_RESPONSE.format(1))
+    method = proxy.catalog.items.get
+    assert isinstance(method, AsyncMethod)
+    assert method is proxy.catalog.items.get
+    assert proxy.catalog is not proxy.items
+    res = loop.run_until_complete(method(123, priority=5))
+    assert res.value == 1
+    assert xmlrpclib.loads(proxy._http_client_inst.requests[0].body) == \
+        ((123,), 'catalog.items.get')
+    with pytest.raises(AttributeError):
+        proxy.__foo__
+
+
+def test_call_func_plain(loop):
+    proxy = AsyncServerProxy(['http://a/RPC2', 'http://b/RPC2'])
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(
+        lambda request: XML_RESPONSE.format(1))
+
+    with mock.patch.object(proxy, '_call') as m_call:
+        res = loop.run_until_complete(proxy.call_func('getData', raw=True))
+        assert res.value.body == XML_RESPONSE.format(1).encode()
+        with pytest.raises(DeadlineExceeded):
+            loop.run_until_complete(
+                proxy.call_func('getData', deadline=time.time()))
+    m_call.assert_not_called()
+    assert proxy.limiter.in_flight == 0
+    assert proxy.limiter.expirations == 1
+    assert sum(endpoint.latency is not None
+               for endpoint in proxy.balancer.endpoints) == 1
+    assert all(endpoint.in_flight == 0
+               for endpoint in proxy.balancer.endpoints)
+
+
+def test_call_func_plain_cancelled(loop):
+    proxy = AsyncServerProxy(['http://a/RPC2', 'http://b/RPC2'],
+                             max_clients=2)
+    proxy.fault_cls = xmlrpclib.Fault
+
+    def handler(request):
+        if b'getOther' in request.body:
+            return XML_RESPONSE.format(1)
+        # Transfer fails after the caller stopped waiting
+        future = tornado.concurrent.Future()
+        tornado.ioloop.IOLoop.current().call_later(
+            0.1, future.set_exception, tornado.httpclient.HTTPError(599))
+        return future
+    proxy._http_client_inst = http_client = FakeHTTPClient(handler)
+
+    async def call():
+        # The third call waits for a slot
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                asyncio.gather(*[proxy.call_func('getData')
+                                 for _ in range(3)]), 0.02)
+        await asyncio.sleep(0.15)
+        assert proxy.limiter.in_flight == 0
+        assert all(endpoint.in_flight == 0
+                   for endpoint in proxy.balancer.endpoints)
+        return await asyncio.wait_for(proxy.call_func('getOther'), 1.0)
+
+    assert loop.run_until_complete(call()) == Result(True, 1, None)
+    assert len(http_client.requests) == 3
+
+
+def test_call_func_with_features(loop):
+    proxy = AsyncServerProxy('http://example.com/RPC2',
+                             observers=[mock.Mock()])
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(
+        lambda request: XML_RESPONSE.format(1))
+    res = loop.run_until_complete(proxy.call_func('getData'))
+    assert res.value == 1
+    proxy.observers[0].assert_called_once()
@@ -0,0 +1,102 @@
+import mock
+import pytest
+
+from tornado_fastrpc.balancer import Balancer, Endpoint
+
+
+def test_endpoint():
+    endpoint = Endpoint('http://example.com:8000/RPC2')
+    assert endpoint.host == 'example.com:8000'
+    assert endpoint.in_flight == 0
+    assert endpoint.healthy is True
+    assert endpoint.url == 'http://example.com:8000/RPC2'
+    assert endpoint.unix_socket is None
+
+
+def test_endpoint_unix_socket():
+    endpoint = Endpoint('unix:///run/rpc.sock')
+    assert endpoint.uri == 'unix:///run/rpc.sock'
+    assert endpoint.url == 'http://localhost/RPC2'
+    assert endpoint.host == 'localhost'
+    assert endpoint.unix_socket == '/run/rpc.sock'
+
+
+def test_endpoint_unix_socket_host_and_path():
+    endpoint = Endpoint('unix://rpc.example.com/run/rpc.sock:/API/RPC2')
+    assert endpoint.url == 'http://rpc.example.com/API/RPC2'
+    assert endpoint.host == 'rpc.example.com'
+    assert endpoint.unix_socket == '/run/rpc.sock'
+
+
+def test_init_fail_when_no_uri():
+    with pytest.raises(ValueError):
+        Balancer([])
+
+
+def test_init_fail_when_unknown_strategy():
+    with pytest.raises(ValueError) as exc_info:
+        Balancer(['http://a/'], strategy='foo')
+    assert "Unknown strategy 'foo'" in str(exc_info.value)
+
+
+def test_select_least_outstanding():
+    balancer = Balancer(['http://a/', 'http://b/', 'http://c/'])
+    a, b, c = balancer.endpoints
+    balancer.on_start(a)
+    balancer.on_start(a)
+    balancer.on_start(c)
+    assert balancer.select() is b
+    assert balancer.select(exclude=[b]) is c
+
+
+def test_select_ewma():
+    balancer = Balancer(['http://a/', 'http://b/'], strategy='ewma')
+    a, b = balancer.endpoints
+    for endpoint, latency in ((a, 0.1), (b, 0.01)):
+        balancer.on_start(endpoint)
+        balancer.on_success(endpoint, latency)
+    assert balancer.select() is b
+    balancer.on_start(a)
+    balancer.on_success(a, 0.001)
+    assert a.latency == pytest.approx(0.3 * 0.001 + 0.7 * 0.1)
+
+
+def test_eject_and_reinstate():
+    balancer = Balancer(['http://a/', 'http://b/'], max_failures=2)
+    a, b = balancer.endpoints
+    balancer.on_start(a)
+    assert balancer.on_failure(a) is False
+    balancer.on_start(a)
+    assert balancer.on_failure(a) is True
+    assert a.healthy is False
+    with mock.patch.object(balancer, '_score', return_value=0):
+        assert all(balancer.select() is b for _ in range(10))
+    balancer.reinstate(a)
+    assert a.healthy is True
+    assert a.failures == 0
+
+
+def test_select_ejected_when_all_ejected():
+    balancer = Balancer(['http://a/', 'http://b/'], max_failures=1)
+    a, b = balancer.endpoints
+    for endpoint in (a, b):
+        balancer.on_start(endpoint)
+        balancer.on_failure(endpoint)
+    assert balancer.select() in (a, b)
+
+
+def test_only_endpoint_is_never_ejected():
+    balancer = Balancer(['http://a/'], max_failures=1)
+    a = balancer.endpoints[0]
+    balancer.on_start(a)
+    assert balancer.on_failure(a) is False
+    assert a.healthy is True
+
+
+def test_select_skips_open_breaker():
+    balancer = Balancer(['http://a/', 'http://b/'])
+    a, b = balancer.endpoints
+    a.breaker = mock.Mock(is_open=True)
+    b.breaker = mock.Mock(is_open=False)
+    assert a.available is False
+    assert all(balancer.select() is b for _ in range(10))
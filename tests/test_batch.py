@@ -0,0 +1,99 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import time
+
+import mock
+import pytest
+import tornado.gen
+import tornado.httpclient
+
+import tornado_fastrpc.client
+from tornado_fastrpc.client import Fault, Result, ServerProxy
+from tornado_fastrpc.limiter import DeadlineExceeded
+
+from .conftest import FakeHTTPClient
+
+
+def multicall_handler(request):
+    params, name = xmlrpclib.loads(request.body)
+    if name != 'system.multicall':
+        return xmlrpclib.dumps((params[0] * 10,), methodresponse=True)
+    results = []
+    for call in params[0]:
+        value = call['params'][0]
+        if value < 0:
+            results.append({'faultCode': -1, 'faultString': 'negative'})
+        else:
+            results.append([value * 10])
+    return xmlrpclib.dumps((results,), methodresponse=True)
+
+
+@pytest.fixture(scope='function')
+def batch_proxy():
+    proxy = ServerProxy('http://example.com:8000/RPC2', batch_window=0,
+                        batch_max_size=3)
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(multicall_handler)
+    return proxy
+
+
+@tornado.gen.coroutine
+def call_many(proxy, values):
+    res = yield [proxy.getX(value, quiet=True) for value in values]
+    raise tornado.gen.Return(res)
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_batch(batch_proxy, run_sync):
+    results = run_sync(call_many, batch_proxy, [1, -2, 3, 4])
+
+    assert [r.value for r in results] == [10, None, 30, 40]
+    assert isinstance(results[1].exception, Fault)
+    assert results[1].exception.faultCode == -1
+    requests = batch_proxy._http_client_inst.requests
+    assert len(requests) == 2
+    assert xmlrpclib.loads(requests[0].body)[1] == 'system.multicall'
+    # The last call is sent alone, without system.multicall
+    assert xmlrpclib.loads(requests[1].body) == ((4,), 'getX')
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_batch_window(batch_proxy, run_sync):
+    batch_proxy._batcher.window = 0.01
+    results = run_sync(call_many, batch_proxy, [1, 2])
+
+    assert results == [Result(True, 10, None), Result(True, 20, None)]
+    assert len(batch_proxy._http_client_inst.requests) == 1
+
+
+def test_batch_fail(batch_proxy, run_sync):
+    error = tornado.httpclient.HTTPError(599)
+    batch_proxy._http_client_inst = FakeHTTPClient(
+        mock.Mock(side_effect=error))
+
+    results = run_sync(call_many, batch_proxy, [1, 2])
+
+    assert results == [Result(False, None, error)] * 2
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_batch_drops_expired_calls(batch_proxy, run_sync):
+    batch_proxy._batcher.window = 0.02
+
+    @tornado.gen.coroutine
+    def test():
+        res = yield [batch_proxy.getX(1, quiet=True,
+                                      deadline=time.time() + 0.005),
+                     batch_proxy.getX(2, quiet=True, priority=1)]
+        raise tornado.gen.Return(res)
+
+    results = run_sync(test)
+
+    assert isinstance(results[0].exception, DeadlineExceeded)
+    assert results[1] == Result(True, 20, None)
+    requests = batch_proxy._http_client_inst.requests
+    assert len(requests) == 1
+    assert xmlrpclib.loads(requests[0].body) == ((2,), 'getX')
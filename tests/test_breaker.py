@@ -0,0 +1,124 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import functools
+
+import mock
+import pytest
+import tornado.httpclient
+
+import tornado_fastrpc.breaker
+import tornado_fastrpc.client
+from tornado_fastrpc.breaker import CircuitBreaker, CircuitOpenError
+from tornado_fastrpc.client import ServerProxy
+
+from .conftest import XML_RESPONSE, FakeHTTPClient
+
+
+@pytest.fixture(scope='function')
+def clock():
+    with mock.patch.object(tornado_fastrpc.breaker, 'time') as m_time:
+        m_time.time.return_value = 1000.0
+        yield m_time
+
+
+def test_open_on_failure_rate(clock):
+    on_state_change = mock.Mock()
+    breaker = CircuitBreaker('http://a/', failure_rate=0.5, min_calls=4,
+                             on_state_change=on_state_change)
+    for success in (True, False, True):
+        assert breaker.allow() is True
+        breaker.record(success, 0.01)
+    assert breaker.state == 'closed'
+    breaker.record(False, 0.01)
+    assert breaker.state == 'open'
+    assert breaker.is_open is True
+    assert breaker.allow() is False
+    on_state_change.assert_called_once_with(breaker, 'closed', 'open')
+
+
+def test_open_on_slow_calls(clock):
+    breaker = CircuitBreaker('http://a/', slow_call_duration=1.0,
+                             slow_call_rate=0.5, min_calls=2)
+    breaker.record(True, 0.1)
+    breaker.record(True, 2.0)
+    assert breaker.state == 'open'
+
+
+def test_window(clock):
+    breaker = CircuitBreaker('http://a/', window=10.0, min_calls=2)
+    breaker.record(False, 0.01)
+    clock.time.return_value = 1011.0
+    breaker.record(False, 0.01)
+    assert breaker.state == 'closed'
+    breaker.record(False, 0.01)
+    assert breaker.state == 'open'
+
+
+@pytest.mark.parametrize('success, expected', [(True, 'closed'),
+                                               (False, 'open')])
+def test_half_open(clock, success, expected):
+    breaker = CircuitBreaker('http://a/', min_calls=1, open_time=5.0)
+    breaker.record(False, 0.01)
+    clock.time.return_value = 1005.0
+    assert breaker.is_open is False
+    assert breaker.allow() is True
+    assert breaker.state == 'half_open'
+    assert breaker.is_open is True
+    assert breaker.allow() is False
+    breaker.cancel()
+    assert breaker.allow() is True
+    breaker.record(success, 0.01)
+    assert breaker.state == expected
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_circuit_open(run_sync, clock):
+    on_state_change = mock.Mock()
+    proxy = ServerProxy(
+        ['http://a/RPC2', 'http://b/RPC2'], max_failures=100,
+        circuit_breaker=functools.partial(
+            CircuitBreaker, min_calls=2, on_state_change=on_state_change))
+    proxy.fault_cls = xmlrpclib.Fault
+
+    def handler(request):
+        if request.headers['Host'] == 'a':
+            raise tornado.httpclient.HTTPError(599)
+        return XML_RESPONSE.format(1)
+    proxy._http_client_inst = http_client = FakeHTTPClient(handler)
+    a, b = proxy.balancer.endpoints
+    assert a.breaker.uri == 'http://a/RPC2'
+
+    for _ in range(2):
+        with mock.patch.object(proxy.balancer, 'select', return_value=a):
+            run_sync(proxy.getData, quiet=True)
+    on_state_change.assert_called_once_with(a.breaker, 'closed', 'open')
+    # Replica with open breaker is avoided
+    assert all(run_sync(proxy.getData).success for _ in range(5))
+    assert len(http_client.requests) == 7
+
+    with mock.patch.object(proxy.balancer, 'select', return_value=a):
+        res = run_sync(proxy.getData, quiet=True)
+    assert isinstance(res.exception, CircuitOpenError)
+    assert str(res.exception) == "Circuit breaker of http://a/RPC2 is open"
+    assert len(http_client.requests) == 7
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_request_error_releases_trial(run_sync, clock):
+    proxy = ServerProxy('http://a/RPC2', circuit_breaker=functools.partial(
+        CircuitBreaker, min_calls=1, open_time=5.0))
+    proxy._http_client_inst = FakeHTTPClient(lambda request: XML_RESPONSE)
+    endpoint, = proxy.balancer.endpoints
+    endpoint.breaker.record(False, 0.01)
+    clock.time.return_value += 5.0
+
+    with mock.patch.object(proxy, '_get_request', side_effect=ValueError):
+        with pytest.raises(ValueError):
+            run_sync(proxy.getData)
+    # Request wasn't sent, so slot and trial call are free again
+    assert proxy.limiter.in_flight == 0
+    assert endpoint.breaker.state == 'half_open'
+    assert endpoint.breaker.allow() is True
@@ -0,0 +1,101 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import mock
+import pytest
+import tornado.gen
+
+import tornado_fastrpc.cache
+import tornado_fastrpc.client
+from tornado_fastrpc.cache import ResponseCache
+from tornado_fastrpc.client import Result, ServerProxy
+
+from .conftest import XML_RESPONSE, FakeHTTPClient
+
+
+@pytest.fixture(scope='function')
+def clock():
+    with mock.patch.object(tornado_fastrpc.cache, 'time') as m_time:
+        m_time.time.return_value = 1000.0
+        yield m_time
+
+
+def test_ttl():
+    cache = ResponseCache({'getConfig': 60.0})
+    assert cache.ttl('getConfig') == 60.0
+    assert cache.ttl('setConfig') is None
+
+
+def test_get_set(clock):
+    cache = ResponseCache({})
+    assert cache.get('a') == (False, None, False)
+    cache.set('a', 1, 10.0, 100)
+    assert cache.get('a') == (True, 1, False)
+    clock.time.return_value = 1010.0
+    assert cache.get('a') == (False, None, False)
+    assert (cache.hits, cache.misses, len(cache), cache.size) == (1, 2, 0, 0)
+
+
+def test_stale_while_revalidate(clock):
+    cache = ResponseCache({}, stale_while_revalidate=5.0)
+    cache.set('a', 1, 10.0, 100)
+    clock.time.return_value = 1012.0
+    assert cache.get('a') == (True, 1, True)
+    assert cache.stale_hits == 1
+    clock.time.return_value = 1016.0
+    assert cache.get('a') == (False, None, False)
+
+
+def test_evict_max_entries(clock):
+    cache = ResponseCache({}, max_entries=2)
+    cache.set('a', 1, 10.0, 1)
+    cache.set('b', 2, 10.0, 1)
+    cache.get('a')
+    cache.set('c', 3, 10.0, 1)
+    assert cache.get('b')[0] is False
+    assert cache.get('a')[0] is True
+    assert cache.evictions == 1
+
+
+def test_evict_max_bytes(clock):
+    cache = ResponseCache({}, max_bytes=100)
+    cache.set('a', 1, 10.0, 60)
+    cache.set('b', 2, 10.0, 60)
+    assert cache.get('a')[0] is False
+    assert cache.size == 60
+    cache.set('c', 3, 10.0, 101)
+    assert cache.get('c')[0] is False
+    assert cache.evictions == 1
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_cached(run_sync, clock):
+    cache = ResponseCache({'getConfig': 10.0}, stale_while_revalidate=5.0)
+    proxy = ServerProxy('http://example.com/RPC2', cache=cache)
+    proxy.fault_cls = xmlrpclib.Fault
+    values = iter(range(1, 100))
+    proxy._http_client_inst = http_client = FakeHTTPClient(
+        lambda request: XML_RESPONSE.format(next(values)))
+
+    @tornado.gen.coroutine
+    def call(name, *args):
+        res = yield proxy.call_func(name, *args)
+        # let background refresh finish
+        yield tornado.gen.moment
+        raise tornado.gen.Return(res)
+
+    assert run_sync(call, 'getConfig', {'a': 1, 'b': 2}) == Result(
+        True, 1, None)
+    assert run_sync(call, 'getConfig', {'b': 2, 'a': 1}).value == 1
+    assert run_sync(call, 'getConfig', {'a': 1}).value == 2
+    assert run_sync(call, 'getOther').value == 3
+    assert run_sync(call, 'getOther').value == 4
+    assert len(http_client.requests) == 4
+    clock.time.return_value = 1012.0
+    # Stale value, refreshed in background
+    assert run_sync(call, 'getConfig', {'a': 1, 'b': 2}).value == 1
+    assert run_sync(call, 'getConfig', {'a': 1, 'b': 2}).value == 5
+    assert len(http_client.requests) == 5
+    assert (cache.hits, cache.stale_hits, cache.misses) == (2, 1, 2)
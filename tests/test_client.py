@@ -7,13 +7,21 @@ except ImportError:
 import mock
 import pycurl
 import pytest
+import tornado.concurrent
+import tornado.curl_httpclient
+import tornado.gen
+import tornado.httpclient
 
 try:
     import fastrpc
 except ImportError:
     fastrpc = None
 import tornado_fastrpc.client
-from tornado_fastrpc.client import Fault, Result, RpcCall, ServerProxy
+from tornado_fastrpc.balancer import Endpoint
+from tornado_fastrpc.client import (Fault, RawValue, Result, RpcCall,
+                                    ServerProxy, _is_fault)
+
+from .conftest import XML_RESPONSE, FakeHTTPClient, make_response
 
 
 @pytest.fixture(scope='function')
@@ -113,9 +121,11 @@ def test_set_curl_opts(server_proxy, patch_attrs, expected_calls):
 @pytest.mark.parametrize(
     'kwargs, expected',
     [
-        ({}, (False,)),
-        ({'quiet': False}, (False,)),
-        ({'quiet': True}, (True,)),
+        ({}, (False, 0, None, False)),
+        ({'quiet': False}, (False, 0, None, False)),
+        ({'quiet': True}, (True, 0, None, False)),
+        ({'priority': 5, 'deadline': 100.0}, (False, 5, 100.0, False)),
+        ({'raw': True}, (False, 0, None, True)),
     ]
 )
 def test_get_extra_kwargs(server_proxy, kwargs, expected):
@@ -380,3 +390,400 @@ def test_process_rpc_response_fastrpc_fail(server_proxy):
         rpc_response = mock.Mock(body=b'\xca\x11\x02\x01x@{ \x03Foo')
         server_proxy._process_rpc_response(rpc_response)
     assert "<Fault -123: Foo>" in str(exc_info.value)
+
+
+def test_init_multiple_uris():
+    proxy = ServerProxy(['http://a:8000/RPC2', 'http://b:8000/RPC2'])
+    assert proxy.uri == 'http://a:8000/RPC2'
+    assert proxy.host == 'a:8000'
+    assert [e.uri for e in proxy.balancer.endpoints] == [
+        'http://a:8000/RPC2', 'http://b:8000/RPC2']
+
+
+def test_get_request_endpoint(server_proxy):
+    endpoint = Endpoint('http://b.example.com/RPC2')
+    request = server_proxy._get_request('foo', (1,), endpoint)
+    assert request.url == 'http://b.example.com/RPC2'
+    assert request.headers['Host'] == 'b.example.com'
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func(server_proxy, run_sync):
+    server_proxy.fault_cls = xmlrpclib.Fault
+    server_proxy._http_client_inst = FakeHTTPClient(
+        lambda request: XML_RESPONSE.format(123))
+
+    res = run_sync(server_proxy.call_func, 'foo', 1)
+
+    assert res == Result(True, 123, None)
+
+
+def test_call_func_quiet(server_proxy, run_sync):
+    error = tornado.httpclient.HTTPError(599)
+    server_proxy._http_client_inst = FakeHTTPClient(mock.Mock(
+        side_effect=error))
+
+    res = run_sync(server_proxy.call_func, 'foo', 1, quiet=True)
+    assert res == Result(False, None, error)
+    with pytest.raises(tornado.httpclient.HTTPError):
+        run_sync(server_proxy.call_func, 'foo', 1)
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_ejects_failing_endpoint(run_sync):
+    proxy = ServerProxy(['http://a/RPC2', 'http://b/RPC2'], max_failures=1)
+    proxy.fault_cls = xmlrpclib.Fault
+
+    def handler(request):
+        if request.url == 'http://a/RPC2':
+            raise tornado.httpclient.HTTPError(503)
+        return XML_RESPONSE.format(1)
+    proxy._http_client_inst = FakeHTTPClient(handler)
+
+    a, b = proxy.balancer.endpoints
+    with mock.patch.object(proxy, '_schedule_probe') as m_probe:
+        with mock.patch.object(proxy.balancer, 'select', return_value=a):
+            res = run_sync(proxy.call_func, 'foo', quiet=True)
+        results = [run_sync(proxy.call_func, 'foo', quiet=True)
+                   for _ in range(4)]
+    assert res.success is False
+    assert a.healthy is False
+    assert b.healthy is True
+    m_probe.assert_called_once_with(a)
+    assert all(r.success for r in results)
+    assert a.in_flight == b.in_flight == 0
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_single_endpoint_skips_balancer(server_proxy, run_sync):
+    server_proxy.fault_cls = xmlrpclib.Fault
+    server_proxy._http_client_inst = FakeHTTPClient(
+        lambda request: XML_RESPONSE.format(1))
+
+    with mock.patch.object(server_proxy.balancer, 'select') as m_select, \
+            mock.patch.object(server_proxy.balancer, 'on_start') as m_start:
+        assert run_sync(server_proxy.call_func, 'foo').value == 1
+    m_select.assert_not_called()
+    m_start.assert_not_called()
+    assert server_proxy.limiter.in_flight == 0
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_probe_reinstates_endpoint(run_sync):
+    proxy = ServerProxy(['http://a/RPC2', 'http://b/RPC2'])
+    a = proxy.balancer.endpoints[0]
+    a.healthy = False
+    proxy._http_client_inst = FakeHTTPClient(
+        lambda request: XML_RESPONSE.format(1))
+
+    run_sync(proxy._probe, a)
+
+    assert a.healthy is True
+    assert b'system.listMethods' in proxy._http_client_inst.requests[0].body
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_single_flight(run_sync):
+    proxy = ServerProxy('http://example.com/RPC2', single_flight=True)
+    proxy.fault_cls = xmlrpclib.Fault
+    pending = []
+
+    def handler(request):
+        future = tornado.concurrent.Future()
+        pending.append(future)
+        return future
+    proxy._http_client_inst = http_client = FakeHTTPClient(handler)
+
+    @tornado.gen.coroutine
+    def call():
+        futures = [proxy.getData(123), proxy.getData(123, quiet=True),
+                   proxy.getData(456)]
+        yield tornado.gen.moment
+        for future in pending:
+            future.set_result(XML_RESPONSE.format(1))
+        res = yield futures
+        raise tornado.gen.Return(res)
+
+    assert run_sync(call) == [Result(True, 1, None)] * 3
+    assert len(http_client.requests) == 2
+    assert proxy._in_flight == {}
+
+
+def test_call_func_single_flight_fail(run_sync):
+    proxy = ServerProxy('http://example.com/RPC2', single_flight=True)
+    error = tornado.httpclient.HTTPError(599)
+    proxy._http_client_inst = FakeHTTPClient(mock.Mock(side_effect=error))
+
+    @tornado.gen.coroutine
+    def call():
+        quiet = proxy.getData(123, quiet=True)
+        loud = proxy.getData(123)
+        res = yield quiet
+        try:
+            yield loud
+        except tornado.httpclient.HTTPError as e:
+            raise tornado.gen.Return((res, e))
+
+    assert run_sync(call) == (Result(False, None, error), error)
+    assert len(proxy._http_client_inst.requests) == 1
+
+
+def test_http_client_recreated_after_fork(server_proxy, run_sync):
+
+    @tornado.gen.coroutine
+    def get_clients():
+        shared = tornado.curl_httpclient.CurlAsyncHTTPClient()
+        with mock.patch.object(tornado_fastrpc.client.os, 'getpid',
+                               return_value=100):
+            first = server_proxy._http_client
+            assert server_proxy._http_client is first
+        # Shared client of the IOLoop is inherited by the child process
+        with mock.patch.object(tornado_fastrpc.client.os, 'getpid',
+                               return_value=101):
+            second = server_proxy._http_client
+            assert server_proxy._http_client is second
+        raise tornado.gen.Return((shared, first, second))
+
+    shared, first, second = run_sync(get_clients)
+    assert first is shared
+    assert second is not first
+    assert isinstance(second, tornado.curl_httpclient.CurlAsyncHTTPClient)
+    # Parent's connections stay intact
+    assert first._closed is False
+    second.close()
+    first.close()
+
+
+def test_warm_up(run_sync):
+
+    def handler(request):
+        if request.headers['Host'] == 'b':
+            raise tornado.httpclient.HTTPError(599)
+        if request.headers['Host'] == 'c':
+            raise tornado.httpclient.HTTPError(404)
+        return ''
+
+    proxy = ServerProxy(['http://a/RPC2', 'http://b/RPC2', 'http://c/RPC2'])
+    proxy._http_client_inst = FakeHTTPClient(handler)
+    opened = run_sync(proxy.warm_up, 2)
+    assert opened == {'http://a/RPC2': 2, 'http://b/RPC2': 0,
+                      'http://c/RPC2': 2}
+    requests = proxy._http_client_inst.requests
+    assert len(requests) == 6
+    assert xmlrpclib.loads(requests[0].body)[1] == 'system.listMethods'
+
+
+def test_http2():
+    proxy = ServerProxy('http://example.com:8000/RPC2', http_version='2',
+                        max_streams=50)
+    assert proxy.keep_alive is True
+    assert proxy.use_http10 is False
+
+    m = mock.Mock()
+    proxy._set_curl_opts(m)
+    m.setopt.assert_has_calls([
+        mock.call(pycurl.HTTP_VERSION,
+                  pycurl.CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE),
+        mock.call(pycurl.PIPEWAIT, 1),
+        mock.call(pycurl.FORBID_REUSE, 0),
+        mock.call(pycurl.FRESH_CONNECT, 0),
+    ])
+    headers = proxy._get_headers()
+    assert headers['Expect'] == ''
+    assert 'Connection' not in headers
+
+    client = proxy._http_client
+    assert client is not tornado.curl_httpclient.CurlAsyncHTTPClient()
+    m = mock.Mock()
+    proxy._set_curl_multi_opts(m)
+    m.setopt.assert_has_calls([
+        mock.call(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX),
+        mock.call(pycurl.M_MAX_CONCURRENT_STREAMS, 50),
+    ])
+    client.close()
+
+
+def test_http_version_overrides_use_http10():
+    proxy = ServerProxy('http://example.com/RPC2', use_http10=True,
+                        http_version='1.1')
+    assert proxy.use_http10 is False
+    assert ServerProxy('http://example.com/RPC2').http_version == '1.0'
+    with pytest.raises(ValueError):
+        ServerProxy('http://example.com/RPC2', http_version='3')
+
+
+class FakeFastRPC(object):
+    """
+    Stands for fastrpc module, binary message is XML prefixed by header.
+    """
+
+    Fault = xmlrpclib.Fault
+
+    def dumps(self, params, name=None, methodresponse=False,
+              useBinary=False, protocolVersionMajor=2,
+              protocolVersionMinor=1):
+        body = xmlrpclib.dumps(params, name, methodresponse).encode()
+        if useBinary:
+            header = bytearray([0xca, 0x11, protocolVersionMajor,
+                                protocolVersionMinor])
+            return bytes(header) + body
+        return body
+
+    def loads(self, data):
+        if data[:2] == b'\xca\x11':
+            data = data[4:]
+        return xmlrpclib.loads(data)[0]
+
+
+def binary_response(request, value, version=(3, 0)):
+    body = FakeFastRPC().dumps((value,), methodresponse=True,
+                               useBinary=True,
+                               protocolVersionMajor=version[0],
+                               protocolVersionMinor=version[1])
+    return make_response(request, body,
+                         headers={'Content-Type': 'application/x-frpc'})
+
+
+def test_use_binary_auto(run_sync):
+    fake = FakeFastRPC()
+
+    def handler(request):
+        return binary_response(request, 1, (3, 1))
+
+    with mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=fake):
+        proxy = ServerProxy('http://a/RPC2', use_binary='auto')
+        proxy._http_client_inst = FakeHTTPClient(handler)
+        assert run_sync(proxy.getData, 'x').value == 1
+        assert run_sync(proxy.getData, 'x').value == 1
+
+    first, second = proxy._http_client_inst.requests
+    assert first.headers['Content-Type'] == 'text/xml'
+    assert first.body[:2] != b'\xca\x11'
+    assert second.headers['Content-Type'] == 'application/x-frpc'
+    # Version is capped to the newest supported one
+    assert second.body[:4] == b'\xca\x11\x03\x00'
+    assert proxy.use_binary is False
+
+
+def test_use_binary_auto_xml_server(run_sync):
+
+    def handler(request):
+        return make_response(request, XML_RESPONSE.format(1),
+                             headers={'Content-Type': 'text/xml'})
+
+    with mock.patch.object(tornado_fastrpc.client, 'fastrpc',
+                           new=FakeFastRPC()):
+        proxy = ServerProxy('http://a/RPC2', use_binary='auto')
+        proxy._http_client_inst = FakeHTTPClient(handler)
+        for _ in range(2):
+            assert run_sync(proxy.getData).value == 1
+
+    for request in proxy._http_client_inst.requests:
+        assert request.headers['Content-Type'] == 'text/xml'
+
+
+def test_use_binary_auto_fallback(run_sync):
+
+    def handler(request):
+        if request.headers['Content-Type'] == 'application/x-frpc':
+            raise tornado.httpclient.HTTPError(415)
+        return binary_response(request, 2)
+
+    with mock.patch.object(tornado_fastrpc.client, 'fastrpc',
+                           new=FakeFastRPC()):
+        proxy = ServerProxy('http://a/RPC2', use_binary='auto')
+        proxy._http_client_inst = FakeHTTPClient(handler)
+        proxy._protocols['http://a/RPC2'] = (3, 0)
+        assert run_sync(proxy.getData).value == 2
+        assert run_sync(proxy.getData).value == 2
+
+    content_types = [request.headers['Content-Type']
+                     for request in proxy._http_client_inst.requests]
+    assert content_types == ['application/x-frpc', 'text/xml', 'text/xml']
+    assert proxy.limiter.in_flight == 0
+
+
+def test_use_binary_auto_encoding_error(run_sync):
+    fake = FakeFastRPC()
+
+    def dumps(params, name=None, useBinary=False, **kwargs):
+        if useBinary:
+            raise TypeError("Can't serialize")
+        return FakeFastRPC.dumps(fake, params, name, useBinary=useBinary,
+                                 **kwargs)
+    fake.dumps = dumps
+
+    with mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=fake):
+        proxy = ServerProxy(['http://a/RPC2', 'http://b/RPC2'],
+                            use_binary='auto')
+        proxy._http_client_inst = FakeHTTPClient(
+            lambda request: XML_RESPONSE.format(1))
+        proxy._protocols['http://b/RPC2'] = (3, 0)
+        b = proxy.balancer.endpoints[1]
+        # Binary body is encoded after the call got its slot
+        with mock.patch.object(proxy.balancer, 'select', return_value=b):
+            with pytest.raises(TypeError):
+                run_sync(proxy.getData)
+
+    assert proxy._http_client_inst.requests == []
+    assert proxy.limiter.in_flight == 0
+
+
+def test_use_binary_auto_without_fastrpc():
+    with mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None):
+        proxy = ServerProxy('http://a/RPC2', use_binary='auto')
+    assert proxy.negotiate_binary is False
+    assert proxy.use_binary is False
+
+
+XML_FAULT = xmlrpclib.dumps(xmlrpclib.Fault(-500, 'Boom'),
+                            methodresponse=True)
+
+
+@pytest.mark.parametrize(
+    'body, expected',
+    [
+        (XML_RESPONSE.format(1).encode(), False),
+        (XML_FAULT.encode(), True),
+        (b'\xca\x11\x02\x01\x70\x38\x01', False),
+        (b'\xca\x11\x03\x00\x78\x38\x01', True),
+        (b'\xca\x11\x02\x01', False),
+        (b'', False),
+    ]
+)
+def test_is_fault(body, expected):
+    assert _is_fault(body) is expected
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_raw(run_sync):
+    proxy = ServerProxy('http://a/RPC2', cache=mock.Mock())
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(lambda request: make_response(
+        request, XML_RESPONSE.format(1), headers={'Content-Type': 'text/xml'}))
+
+    with mock.patch.object(tornado_fastrpc.client, '_loads',
+                           wraps=tornado_fastrpc.client._loads) as m_loads:
+        res = run_sync(proxy.getData, 123, raw=True)
+        assert isinstance(res.value, RawValue)
+        assert res.value.body == XML_RESPONSE.format(1).encode()
+        assert res.value.content_type == 'text/xml'
+        assert m_loads.call_count == 0
+        assert res.value.value == 1
+        assert res.value.value == 1
+        assert m_loads.call_count == 1
+    # Raw calls bypass the cache
+    assert proxy.cache.mock_calls == []
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_raw_fault(run_sync):
+    proxy = ServerProxy('http://a/RPC2')
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(
+        lambda request: make_response(request, XML_FAULT))
+
+    res = run_sync(proxy.getData, 123, raw=True, quiet=True)
+    assert res.success is False
+    assert isinstance(res.exception, Fault)
+    assert res.exception.faultCode == -500
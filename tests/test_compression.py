@@ -0,0 +1,115 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import zlib
+
+import mock
+import pytest
+
+import tornado_fastrpc.client
+from tornado_fastrpc.client import ServerProxy
+from tornado_fastrpc.compression import (Compression, ResponseTooLarge,
+                                         decompress, gzip_compress)
+
+from .conftest import XML_RESPONSE, FakeHTTPClient, make_response
+
+DATA = b'<value>abc</value>' * 100
+
+
+def deflate(data, wbits):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+@pytest.mark.parametrize('encoding, data', [
+    ('gzip', gzip_compress(DATA, 6)),
+    ('deflate', deflate(DATA, zlib.MAX_WBITS)),
+    ('deflate', deflate(DATA, -zlib.MAX_WBITS)),
+])
+def test_decompress(encoding, data):
+    assert decompress(data, encoding, len(DATA)) == DATA
+
+
+def test_decompress_too_large():
+    with pytest.raises(ResponseTooLarge):
+        decompress(gzip_compress(DATA, 6), 'gzip', len(DATA) - 1)
+
+
+def test_decompress_unsupported():
+    with pytest.raises(ValueError):
+        decompress(DATA, 'br', len(DATA))
+
+
+def test_decode_counts_bytes():
+    compression = Compression()
+    compressed = gzip_compress(DATA, 6)
+    assert compression.decode('foo', compressed, 'GZIP') == DATA
+    assert compression.decode('foo', b'abc', None) == b'abc'
+    compression.count_request('foo', 100, 10)
+    assert compression.snapshot() == {'foo': {
+        'request_raw': 100,
+        'request_sent': 10,
+        'response_received': len(compressed) + 3,
+        'response_raw': len(DATA) + 3,
+    }}
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_proxy_compression(run_sync):
+
+    def handler(request):
+        return make_response(
+            request, gzip_compress(XML_RESPONSE.format(1).encode(), 6),
+            headers={'Content-Encoding': 'gzip'})
+
+    compression = Compression(threshold=100, level=1)
+    proxy = ServerProxy('http://example.com/RPC2', compression=compression)
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(handler)
+
+    res = run_sync(proxy.getData, 'x' * 1000)
+    assert res.value == 1
+
+    request = proxy._http_client_inst.requests[0]
+    assert request.headers['Accept-Encoding'] == 'gzip, deflate'
+    assert request.headers['Content-Encoding'] == 'gzip'
+    assert request.decompress_response is False
+    params, name = xmlrpclib.loads(zlib.decompress(request.body,
+                                                   16 + zlib.MAX_WBITS))
+    assert params == ('x' * 1000,)
+    stats = compression.snapshot()['getData']
+    assert stats['request_sent'] < stats['request_raw']
+    assert stats['response_received'] < stats['response_raw']
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_proxy_small_request_not_compressed(run_sync):
+    proxy = ServerProxy('http://example.com/RPC2',
+                        compression=Compression(threshold=10000))
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(
+        lambda request: XML_RESPONSE.format(1))
+
+    assert run_sync(proxy.getData, 1).value == 1
+    request = proxy._http_client_inst.requests[0]
+    assert 'Content-Encoding' not in request.headers
+    assert xmlrpclib.loads(request.body) == ((1,), 'getData')
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_proxy_body_like_gzip_not_marked(run_sync):
+    proxy = ServerProxy('http://example.com/RPC2',
+                        compression=Compression(threshold=10000))
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(
+        lambda request: XML_RESPONSE.format(1))
+
+    # Only the body compressed by the proxy is sent with Content-Encoding
+    with mock.patch.object(proxy, '_get_post_body',
+                           return_value=b'\x1f\x8bnot gzip'):
+        assert run_sync(proxy.getData, 1).value == 1
+    request = proxy._http_client_inst.requests[0]
+    assert request.body == b'\x1f\x8bnot gzip'
+    assert 'Content-Encoding' not in request.headers
@@ -0,0 +1,241 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import time
+
+import pytest
+import tornado.concurrent
+import tornado.gen
+import tornado.httpclient
+
+from tornado_fastrpc.client import ServerProxy
+from tornado_fastrpc.limiter import (AdaptiveLimiter, ConcurrencyLimiter,
+                                     DeadlineExceeded, LimitExceeded)
+
+from .conftest import XML_RESPONSE, FakeHTTPClient
+
+
+def test_acquire_and_release(run_sync):
+
+    @tornado.gen.coroutine
+    def test():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1, max_wait=1.0)
+        yield limiter.acquire()
+        second = limiter.acquire()
+        assert not second.done()
+        assert limiter.queue_depth == 1
+        with pytest.raises(LimitExceeded):
+            yield limiter.acquire()
+        limiter.release(0.01, True)
+        yield second
+        assert limiter.snapshot() == {
+            'limit': 1, 'in_flight': 1, 'queue_depth': 0, 'rejections': 1,
+            'expirations': 0,
+        }
+
+    run_sync(test)
+
+
+def test_max_wait(run_sync):
+
+    @tornado.gen.coroutine
+    def test():
+        limiter = ConcurrencyLimiter(limit=1, max_wait=0.01)
+        yield limiter.acquire()
+        with pytest.raises(LimitExceeded):
+            yield limiter.acquire()
+        assert limiter.queue_depth == 0
+        assert limiter.rejections == 1
+
+    run_sync(test)
+
+
+def test_priority(run_sync):
+
+    @tornado.gen.coroutine
+    def test():
+        limiter = ConcurrencyLimiter(limit=1, max_wait=None)
+        yield limiter.acquire()
+        low = limiter.acquire(priority=0)
+        high = limiter.acquire(priority=10)
+        other_low = limiter.acquire(priority=0)
+        limiter.release()
+        assert high.done() and not low.done()
+        limiter.release()
+        assert low.done() and not other_low.done()
+        limiter.release()
+        yield other_low
+
+    run_sync(test)
+
+
+def test_cancelled_waiter(run_sync):
+
+    @tornado.gen.coroutine
+    def test():
+        limiter = ConcurrencyLimiter(limit=1, max_wait=None)
+        yield limiter.acquire()
+        cancelled = limiter.acquire()
+        waiting = limiter.acquire()
+        cancelled.cancel()
+        limiter.release()
+        yield waiting
+        assert limiter.in_flight == 1
+        limiter.release()
+        assert limiter.in_flight == 0
+
+        yield limiter.acquire()
+        expired = limiter.acquire(deadline=time.time() + 0.01)
+        expired.cancel()
+        yield tornado.gen.sleep(0.02)
+        assert limiter.snapshot() == {
+            'limit': 1, 'in_flight': 1, 'queue_depth': 0, 'rejections': 0,
+            'expirations': 0,
+        }
+
+    run_sync(test)
+
+
+def test_deadline(run_sync):
+
+    @tornado.gen.coroutine
+    def test():
+        limiter = ConcurrencyLimiter(limit=1, max_wait=1.0)
+        with pytest.raises(DeadlineExceeded):
+            yield limiter.acquire(deadline=time.time() - 1.0)
+        yield limiter.acquire(deadline=time.time() + 1.0)
+        with pytest.raises(DeadlineExceeded):
+            yield limiter.acquire(deadline=time.time() + 0.01)
+        assert limiter.queue_depth == 0
+        assert limiter.expirations == 2
+        assert limiter.rejections == 0
+        assert limiter.in_flight == 1
+
+    run_sync(test)
+
+
+def test_unknown_algorithm():
+    with pytest.raises(ValueError):
+        AdaptiveLimiter(algorithm='foo')
+
+
+def test_aimd():
+    limiter = AdaptiveLimiter(initial_limit=4, min_limit=2, max_limit=5,
+                              latency_threshold=1.0, backoff_ratio=0.5)
+    limiter.in_flight = 3
+    limiter.release(0.1, True)
+    assert limiter.limit == 4.25
+    limiter.in_flight = 4
+    for _ in range(10):
+        limiter.release(0.1, True)
+        limiter.in_flight += 1
+    assert limiter.limit == 5
+    limiter.release(0.1, False)
+    assert limiter.limit == 2.5
+    limiter.in_flight += 1
+    limiter.release(2.0, True)
+    assert limiter.limit == 2
+
+
+def test_aimd_idle():
+    # Limit doesn't grow when it isn't used
+    limiter = AdaptiveLimiter(initial_limit=10)
+    limiter.in_flight = 1
+    limiter.release(0.1, True)
+    assert limiter.limit == 10
+
+
+def test_gradient():
+    limiter = AdaptiveLimiter(initial_limit=20, max_limit=100,
+                              algorithm='gradient')
+    for _ in range(50):
+        limiter.in_flight = 1
+        limiter.release(0.01, True)
+    grown = limiter.limit
+    assert grown > 20
+    for _ in range(50):
+        limiter.in_flight = 1
+        limiter.release(0.1, True)
+    assert limiter.limit < grown
+
+
+def test_proxy_limits_calls(run_sync):
+    futures = []
+
+    def handler(request):
+        futures.append(tornado.concurrent.Future())
+        return futures[-1]
+
+    @tornado.gen.coroutine
+    def test():
+        limiter = ConcurrencyLimiter(limit=1)
+        proxy = ServerProxy('http://a/RPC2', limiter=limiter)
+        proxy.fault_cls = xmlrpclib.Fault
+        proxy._http_client_inst = FakeHTTPClient(handler)
+        first = proxy.getData()
+        second = proxy.getData()
+        yield tornado.gen.moment
+        assert len(futures) == 1
+        assert limiter.queue_depth == 1
+        futures[0].set_result(XML_RESPONSE.format(1))
+        res = yield first
+        assert res.value == 1
+        assert limiter.in_flight == 1
+        futures[1].set_result(XML_RESPONSE.format(2))
+        res = yield second
+        assert res.value == 2
+        assert limiter.in_flight == 0
+
+    run_sync(test)
+
+
+def test_proxy_failure_decreases_limit(run_sync):
+
+    def handler(request):
+        raise tornado.httpclient.HTTPError(503)
+
+    @tornado.gen.coroutine
+    def test():
+        limiter = AdaptiveLimiter(initial_limit=10, backoff_ratio=0.5)
+        proxy = ServerProxy('http://a/RPC2', limiter=limiter)
+        proxy._http_client_inst = FakeHTTPClient(handler)
+        res = yield proxy.getData(quiet=True)
+        assert res.success is False
+        assert limiter.limit == 5
+        assert limiter.in_flight == 0
+
+    run_sync(test)
+
+
+def test_proxy_max_clients():
+    proxy = ServerProxy('http://a/RPC2', max_clients=10,
+                        limiter=AdaptiveLimiter(max_limit=50))
+    assert proxy.max_clients == 50
+
+
+def test_proxy_schedules_calls_by_default():
+    proxy = ServerProxy('http://a/RPC2', max_clients=5)
+    assert isinstance(proxy.limiter, ConcurrencyLimiter)
+    assert proxy.limiter.limit == 5
+
+
+def test_proxy_drops_expired_call(run_sync):
+    proxy = ServerProxy('http://a/RPC2')
+    proxy._http_client_inst = FakeHTTPClient(lambda request: '')
+    res = run_sync(proxy.getData, quiet=True, deadline=time.time() - 1.0)
+    assert isinstance(res.exception, DeadlineExceeded)
+    assert proxy._http_client_inst.requests == []
+    assert proxy.limiter.expirations == 1
+
+
+def test_proxy_propagates_deadline(run_sync):
+    proxy = ServerProxy('http://a/RPC2', timeout=5.0)
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(
+        lambda request: XML_RESPONSE.format(1))
+    res = run_sync(proxy.getData, deadline=time.time() + 0.5)
+    assert res.value == 1
+    request = proxy._http_client_inst.requests[0]
+    assert 0.0 < request.request_timeout <= 0.5
@@ -0,0 +1,96 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import concurrent.futures
+
+import mock
+import pytest
+
+import tornado_fastrpc.client
+from tornado_fastrpc.client import Fault, Result, ServerProxy
+from tornado_fastrpc.offload import Offloader
+
+from .conftest import XML_RESPONSE, FakeHTTPClient
+
+
+@pytest.fixture(scope='module')
+def executor():
+    executor = concurrent.futures.ThreadPoolExecutor(2)
+    yield executor
+    executor.shutdown()
+
+
+def test_should_offload(executor):
+    offloader = Offloader(executor, threshold=100)
+    assert offloader.should_offload(101) is True
+    assert offloader.should_offload(100) is False
+    assert offloader.inline == 1
+
+
+def test_encode_decode(executor, run_sync):
+    offloader = Offloader(executor)
+    body = run_sync(offloader.encode, xmlrpclib.dumps, ('abc',), 'foo')
+    assert run_sync(offloader.decode, xmlrpclib.loads, body) == (
+        ('abc',), 'foo')
+    assert (offloader.encodes, offloader.decodes) == (1, 1)
+    assert offloader.offloaded_bytes == 2 * len(body)
+    assert offloader.saved_time > 0.0
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_offload(executor, run_sync):
+    proxy = ServerProxy('http://example.com/RPC2', executor=executor,
+                        offload_threshold=200)
+    proxy.fault_cls = xmlrpclib.Fault
+
+    def handler(request):
+        if b'x' * 100 in request.body:
+            return xmlrpclib.dumps(('y' * 300,), methodresponse=True)
+        return XML_RESPONSE.format(1)
+    proxy._http_client_inst = FakeHTTPClient(handler)
+
+    assert run_sync(proxy.call_func, 'foo', 1) == Result(True, 1, None)
+    assert proxy.offloader.inline == 2
+    res = run_sync(proxy.call_func, 'foo', ['x' * 100] * 3)
+    assert res == Result(True, 'y' * 300, None)
+    assert (proxy.offloader.encodes, proxy.offloader.decodes) == (1, 1)
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_offload_fault(executor, run_sync):
+    proxy = ServerProxy('http://example.com/RPC2', executor=executor,
+                        offload_threshold=0)
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(lambda request: xmlrpclib.dumps(
+        xmlrpclib.Fault(-1, 'Foo'), methodresponse=True))
+
+    res = run_sync(proxy.call_func, 'foo', quiet=True)
+    assert isinstance(res.exception, Fault)
+    assert str(res.exception) == '<Fault -1: Foo>'
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_offload_fault_process_pool(run_sync):
+    proxy = ServerProxy('http://example.com/RPC2',
+                        executor=concurrent.futures.ProcessPoolExecutor(1),
+                        offload_threshold=0)
+    proxy.fault_cls = xmlrpclib.Fault
+
+    def handler(request):
+        if b'fail' in request.body:
+            return xmlrpclib.dumps(xmlrpclib.Fault(-1, 'Foo'),
+                                   methodresponse=True)
+        return XML_RESPONSE.format(1)
+    proxy._http_client_inst = FakeHTTPClient(handler)
+
+    try:
+        res = run_sync(proxy.call_func, 'fail', quiet=True)
+        # Fault doesn't break the pool
+        assert run_sync(proxy.call_func, 'foo') == Result(True, 1, None)
+    finally:
+        proxy.offloader.executor.shutdown()
+    assert isinstance(res.exception, Fault)
+    assert str(res.exception) == '<Fault -1: Foo>'
+    assert proxy.offloader.decodes == 2
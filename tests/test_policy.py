@@ -0,0 +1,300 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import socket
+
+import mock
+import pytest
+import tornado.concurrent
+import tornado.gen
+import tornado.httpclient
+import tornado.httpserver
+import tornado.ioloop
+import tornado.testing
+import tornado.web
+
+import tornado_fastrpc.client
+from tornado_fastrpc.client import Fault, Result, ServerProxy
+from tornado_fastrpc.policy import Budget, HedgePolicy, RetryPolicy
+from tornado_fastrpc.stats import CallTiming
+
+from .conftest import XML_RESPONSE, FakeHTTPClient
+
+
+def test_budget():
+    budget = Budget(ratio=0.5, max_tokens=2.0)
+    assert budget.withdraw() is True
+    assert budget.withdraw() is True
+    assert budget.withdraw() is False
+    budget.deposit()
+    assert budget.withdraw() is False
+    budget.deposit()
+    assert budget.withdraw() is True
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2.0
+
+
+def test_hedge_policy_delay():
+    policy = HedgePolicy(['foo'], default_delay=0.1, min_samples=10)
+    assert policy.applies('foo') is True
+    assert policy.applies('bar') is False
+    assert policy.get_delay('foo') == 0.1
+    for i in range(1, 101):
+        policy.timings(CallTiming('foo', 'http://a/', None, 0.0, 0.0, 0.0,
+                                  i / 1000.0, {}))
+    assert policy.get_delay('foo') == pytest.approx(0.095, rel=0.05)
+    assert HedgePolicy(['foo'], delay=0.2).get_delay('foo') == 0.2
+
+
+def delayed_handler(delays, body=None):
+    """
+    Respond after delay given by host of the request.
+    """
+
+    def handler(request):
+        host = request.headers['Host']
+        future = tornado.concurrent.Future()
+        tornado.ioloop.IOLoop.current().call_later(
+            delays[host], future.set_result,
+            body or XML_RESPONSE.format(ord(host)))
+        return future
+    return handler
+
+
+@pytest.fixture(scope='function')
+def hedge_proxy():
+    policy = HedgePolicy(['getData'], delay=0.01)
+    proxy = ServerProxy(['http://a/RPC2', 'http://b/RPC2'],
+                        hedge_policy=policy)
+    proxy.fault_cls = xmlrpclib.Fault
+    return proxy
+
+
+def patch_select(proxy):
+    a, b = proxy.balancer.endpoints
+    return mock.patch.object(
+        proxy.balancer, 'select',
+        side_effect=lambda exclude=(): b if a in exclude else a)
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_hedge_wins(hedge_proxy, run_sync):
+    hedge_proxy._http_client_inst = FakeHTTPClient(
+        delayed_handler({'a': 0.5, 'b': 0.001}))
+
+    with patch_select(hedge_proxy):
+        res = run_sync(hedge_proxy.getData, 1)
+
+    assert res == Result(True, ord('b'), None)
+    assert (hedge_proxy.hedge_policy.hedged,
+            hedge_proxy.hedge_policy.wins) == (1, 1)
+    a, b = hedge_proxy.balancer.endpoints
+    assert a.in_flight == b.in_flight == 0
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_hedge_not_needed(hedge_proxy, run_sync):
+    hedge_proxy._http_client_inst = http_client = FakeHTTPClient(
+        delayed_handler({'a': 0.001, 'b': 0.001}))
+
+    with patch_select(hedge_proxy):
+        assert run_sync(hedge_proxy.getData, 1).value == ord('a')
+        assert run_sync(hedge_proxy.getOther, 1).value == ord('a')
+
+    assert len(http_client.requests) == 2
+    assert hedge_proxy.hedge_policy.hedged == 0
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_hedge_budget_exhausted(hedge_proxy, run_sync):
+    hedge_proxy.hedge_policy.budget = Budget(max_tokens=0.0)
+    hedge_proxy._http_client_inst = http_client = FakeHTTPClient(
+        delayed_handler({'a': 0.03, 'b': 0.001}))
+
+    with patch_select(hedge_proxy):
+        assert run_sync(hedge_proxy.getData, 1).value == ord('a')
+
+    assert len(http_client.requests) == 1
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_hedge_first_fails(hedge_proxy, run_sync):
+    error = tornado.httpclient.HTTPError(599)
+    respond_b = delayed_handler({'b': 0.03})
+
+    def handler(request):
+        if request.headers['Host'] == 'b':
+            return respond_b(request)
+        future = tornado.concurrent.Future()
+        tornado.ioloop.IOLoop.current().call_later(
+            0.02, future.set_exception, error)
+        return future
+    hedge_proxy._http_client_inst = FakeHTTPClient(handler)
+
+    with patch_select(hedge_proxy):
+        assert run_sync(hedge_proxy.getData, 1).value == ord('b')
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_hedge_fault(hedge_proxy, run_sync):
+    fault = xmlrpclib.dumps(xmlrpclib.Fault(-1, 'Foo'), methodresponse=True)
+    hedge_proxy._http_client_inst = FakeHTTPClient(
+        delayed_handler({'a': 0.5, 'b': 0.001}, fault))
+
+    with patch_select(hedge_proxy):
+        res = run_sync(hedge_proxy.getData, 1, quiet=True)
+
+    assert isinstance(res.exception, Fault)
+
+
+class DelayedHandler(tornado.web.RequestHandler):
+
+    def initialize(self, delay, code):
+        self.delay = delay
+        self.code = code
+
+    @tornado.gen.coroutine
+    def post(self):
+        yield tornado.gen.sleep(self.delay)
+        self.set_status(self.code)
+        self.finish(XML_RESPONSE.format(self.code))
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_hedge_loser_of_curl_completes(run_sync, caplog):
+
+    @tornado.gen.coroutine
+    def call():
+        servers = []
+        uris = []
+        # Slow replica fails after the hedge won
+        for delay, code in ((0.2, 500), (0.0, 200)):
+            sock, port = tornado.testing.bind_unused_port()
+            server = tornado.httpserver.HTTPServer(tornado.web.Application([
+                (r'/RPC2', DelayedHandler, {'delay': delay, 'code': code}),
+            ]))
+            server.add_sockets([sock])
+            servers.append(server)
+            uris.append('http://127.0.0.1:{}/RPC2'.format(port))
+        proxy = ServerProxy(uris, hedge_policy=HedgePolicy(['getData'],
+                                                           delay=0.01))
+        proxy.fault_cls = xmlrpclib.Fault
+        a, b = proxy.balancer.endpoints
+        with patch_select(proxy):
+            res = yield proxy.getData()
+        # Let the loser finish
+        yield tornado.gen.sleep(0.3)
+        proxy._http_client.close()
+        for server in servers:
+            server.stop()
+        raise tornado.gen.Return((res, a.in_flight, b.in_flight))
+
+    assert run_sync(call) == (Result(True, 200, None), 0, 0)
+    assert "after Future was cancelled" not in caplog.text
+
+
+@pytest.mark.parametrize(
+    'exc, expected',
+    [
+        (tornado.httpclient.HTTPError(599), True),
+        (tornado.httpclient.HTTPError(503), True),
+        (tornado.httpclient.HTTPError(404), False),
+        (Fault(-503, 'Busy'), True),
+        (Fault(-500, 'Error'), False),
+        (socket.error('reset'), True),
+        (ValueError(), False),
+    ]
+)
+def test_retry_policy_is_retryable(exc, expected):
+    policy = RetryPolicy(['foo'], fault_codes=[-503])
+    assert policy.is_retryable(exc) is expected
+
+
+def test_retry_policy_backoff():
+    policy = RetryPolicy(['foo'], backoff=0.1, multiplier=2.0,
+                         max_backoff=0.3)
+    for _ in range(100):
+        assert 0.0 <= policy.get_backoff(0) <= 0.1
+        assert 0.0 <= policy.get_backoff(1) <= 0.2
+        assert 0.0 <= policy.get_backoff(5) <= 0.3
+
+
+@pytest.fixture(scope='function')
+def retry_proxy():
+    policy = RetryPolicy(['getData'], backoff=0.001, fault_codes=[-503])
+    proxy = ServerProxy(['http://a/RPC2', 'http://b/RPC2'],
+                        retry_policy=policy, max_failures=100)
+    proxy.fault_cls = xmlrpclib.Fault
+    return proxy
+
+
+def failing_handler(errors):
+    def handler(request):
+        if errors:
+            error = errors.pop(0)
+            if isinstance(error, xmlrpclib.Fault):
+                return xmlrpclib.dumps(error, methodresponse=True)
+            raise error
+        return XML_RESPONSE.format(ord(request.headers['Host']))
+    return handler
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_retry(retry_proxy, run_sync):
+    retry_proxy._http_client_inst = http_client = FakeHTTPClient(
+        failing_handler([tornado.httpclient.HTTPError(503),
+                         xmlrpclib.Fault(-503, 'Busy')]))
+
+    res = run_sync(retry_proxy.getData, 1)
+
+    assert res.success is True
+    hosts = [r.headers['Host'] for r in http_client.requests]
+    assert len(hosts) == 3
+    # Retry goes to another replica
+    assert hosts[0] != hosts[1]
+    assert retry_proxy.retry_policy.retries == 2
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_retry_max_attempts(retry_proxy, run_sync):
+    errors = [tornado.httpclient.HTTPError(599) for _ in range(5)]
+    retry_proxy._http_client_inst = http_client = FakeHTTPClient(
+        failing_handler(errors))
+
+    res = run_sync(retry_proxy.getData, 1, quiet=True)
+
+    assert res.success is False
+    assert len(http_client.requests) == 3
+    assert len(errors) == 2
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_retry_not_retryable(retry_proxy, run_sync):
+    retry_proxy._http_client_inst = http_client = FakeHTTPClient(
+        failing_handler([tornado.httpclient.HTTPError(599)]))
+
+    assert run_sync(retry_proxy.setData, 1, quiet=True).success is False
+    retry_proxy._http_client_inst = http_client = FakeHTTPClient(
+        failing_handler([xmlrpclib.Fault(-500, 'Error')]))
+    res = run_sync(retry_proxy.getData, 1, quiet=True)
+    assert res.exception.faultCode == -500
+    assert len(http_client.requests) == 1
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_retry_budget_and_deadline(retry_proxy, run_sync):
+    retry_proxy.retry_policy.budget = Budget(max_tokens=0.0)
+    retry_proxy._http_client_inst = http_client = FakeHTTPClient(
+        failing_handler([tornado.httpclient.HTTPError(599)]))
+    assert run_sync(retry_proxy.getData, 1, quiet=True).success is False
+    assert len(http_client.requests) == 1
+
+    retry_proxy.retry_policy.budget = Budget()
+    retry_proxy.retry_policy.deadline = 0.0001
+    retry_proxy._http_client_inst = http_client = FakeHTTPClient(
+        failing_handler([tornado.httpclient.HTTPError(599)]))
+    assert run_sync(retry_proxy.getData, 1, quiet=True).success is False
+    assert len(http_client.requests) == 1
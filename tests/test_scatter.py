@@ -0,0 +1,123 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import time
+
+import mock
+import pytest
+import tornado.concurrent
+import tornado.gen
+
+import tornado_fastrpc.client
+from tornado_fastrpc.cache import ResponseCache
+from tornado_fastrpc.client import Fault, Result
+from tornado_fastrpc.scatter import ShardedProxy, ShardPending
+
+from .conftest import XML_RESPONSE, FakeHTTPClient
+
+XML_FAULT = xmlrpclib.dumps(xmlrpclib.Fault(-1, 'Error'),
+                            methodresponse=True)
+
+URIS = ['http://a/RPC2', 'http://b/RPC2', 'http://c/RPC2']
+
+
+def make_shards(handlers, **kwargs):
+    shards = ShardedProxy(URIS[:len(handlers)], **kwargs)
+    for proxy, handler in zip(shards.proxies, handlers):
+        proxy.fault_cls = xmlrpclib.Fault
+        proxy._http_client_inst = FakeHTTPClient(handler)
+    return shards
+
+
+def respond(value):
+    return lambda request: XML_RESPONSE.format(value)
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_serializes_once(run_sync):
+    shards = make_shards([respond(1), respond(2), respond(3)])
+
+    with mock.patch.object(tornado_fastrpc.client, '_dumps',
+                           wraps=tornado_fastrpc.client._dumps) as m_dumps:
+        results = run_sync(shards.call_func, 'getItems', [1, 2])
+
+    assert results == [Result(True, 1, None), Result(True, 2, None),
+                       Result(True, 3, None)]
+    m_dumps.assert_called_once_with(([1, 2],), 'getItems', False, None)
+    bodies = set(proxy._http_client_inst.requests[0].body
+                 for proxy in shards.proxies)
+    assert len(bodies) == 1
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_scatter_not_shared_with_cache(run_sync):
+    shards = make_shards([respond(1), respond(2)],
+                         cache=lambda: ResponseCache({'getItems': 10}))
+
+    with mock.patch.object(tornado_fastrpc.client, '_dumps',
+                           wraps=tornado_fastrpc.client._dumps) as m_dumps:
+        results = run_sync(shards.scatter, 'getItems', [(1,), (1,)])
+
+    assert [res.value for res in results] == [1, 2]
+    assert m_dumps.call_count == 2
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_scatter_quorum(run_sync):
+    pending = tornado.concurrent.Future()
+    shards = make_shards([respond(1), lambda request: pending,
+                          lambda request: XML_FAULT])
+
+    @tornado.gen.coroutine
+    def call():
+        results = yield shards.scatter('getItems', [(1,), (2,), (3,)],
+                                       quorum=1)
+        pending.set_result(XML_RESPONSE.format(2))
+        yield tornado.gen.moment
+        raise tornado.gen.Return(results)
+
+    first, second, third = run_sync(call)
+    assert first == Result(True, 1, None)
+    assert isinstance(second.exception, ShardPending)
+    assert "Quorum" in str(second.exception)
+    assert isinstance(third.exception, (Fault, ShardPending))
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_scatter_deadline(run_sync):
+    pending = tornado.concurrent.Future()
+    shards = make_shards([respond(1), lambda request: pending,
+                          lambda request: XML_FAULT])
+
+    @tornado.gen.coroutine
+    def call():
+        results = yield shards.scatter('getItems', [(1,), (2,), None],
+                                       quorum=2, deadline=time.time() + 0.05)
+        pending.set_result(XML_RESPONSE.format(2))
+        yield tornado.gen.moment
+        raise tornado.gen.Return(results)
+
+    first, second, third = run_sync(call)
+    assert first == Result(True, 1, None)
+    assert isinstance(second.exception, ShardPending)
+    assert "Deadline" in str(second.exception)
+    assert third is None
+    assert shards.proxies[2]._http_client_inst.requests == []
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_scatter_faults(run_sync):
+    shards = make_shards([respond(1), lambda request: XML_FAULT])
+
+    first, second = run_sync(shards.scatter, 'getItems', [(1,), (2,)])
+    assert first == Result(True, 1, None)
+    assert second.success is False
+    assert second.exception.faultCode == -1
+
+
+def test_scatter_fail_when_args_mismatch(run_sync):
+    shards = ShardedProxy(URIS)
+    with pytest.raises(ValueError):
+        run_sync(shards.scatter, 'getItems', [(1,)])
@@ -0,0 +1,177 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import mock
+import pytest
+import tornado.concurrent
+import tornado.gen
+import tornado.httpclient
+import tornado.httpserver
+import tornado.testing
+import tornado.web
+
+import tornado_fastrpc.client
+from tornado_fastrpc.client import Fault, ServerProxy
+from tornado_fastrpc.server import Dispatcher, RpcHandler
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = Dispatcher()
+
+    @dispatcher.register
+    def add(a, b):
+        """Return sum of a and b."""
+        return a + b
+
+    @dispatcher.register(name='math.div')
+    @tornado.gen.coroutine
+    def div(a, b):
+        yield tornado.gen.moment
+        raise tornado.gen.Return(a / b)
+
+    @dispatcher.register
+    def fail(code):
+        raise xmlrpclib.Fault(code, 'Failed')
+
+    return dispatcher
+
+
+def call_server(dispatcher, func):
+    """
+    Start server of the *dispatcher* and run coroutine *func* with its URL.
+    """
+    @tornado.gen.coroutine
+    def run():
+        sock, port = tornado.testing.bind_unused_port()
+        server = tornado.httpserver.HTTPServer(tornado.web.Application([
+            (r'/RPC2', RpcHandler, {'dispatcher': dispatcher}),
+        ]))
+        server.add_sockets([sock])
+        try:
+            result = yield func('http://127.0.0.1:{}/RPC2'.format(port))
+        finally:
+            server.stop()
+        raise tornado.gen.Return(result)
+    return run
+
+
+def make_proxy(uri):
+    proxy = ServerProxy(uri)
+    proxy.fault_cls = xmlrpclib.Fault
+    return proxy
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_server_dispatch(dispatcher, run_sync):
+
+    @tornado.gen.coroutine
+    def call(uri):
+        proxy = make_proxy(uri)
+        results = yield [proxy.add(1, 2), proxy.math.div(6, 3),
+                         proxy.fail(-1, quiet=True),
+                         proxy.missing(quiet=True),
+                         proxy.math.div(1, 0, quiet=True)]
+        raise tornado.gen.Return(results)
+
+    added, divided, failed, missing, error = run_sync(
+        call_server(dispatcher, call))
+    assert added.value == 3
+    assert divided.value == 2
+    assert isinstance(failed.exception, Fault)
+    assert failed.exception.faultCode == -1
+    assert missing.exception.faultCode == -32601
+    assert error.exception.faultCode == -32603
+    assert 'ZeroDivisionError' in error.exception.faultString
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_server_multicall_is_concurrent(dispatcher, run_sync):
+    started = []
+    both_started = tornado.concurrent.Future()
+
+    @dispatcher.register
+    @tornado.gen.coroutine
+    def wait(value):
+        started.append(value)
+        if len(started) == 2:
+            both_started.set_result(None)
+        yield both_started
+        raise tornado.gen.Return(value)
+
+    @tornado.gen.coroutine
+    def call(uri):
+        res = yield make_proxy(uri).system.multicall([
+            {'methodName': 'wait', 'params': [1]},
+            {'methodName': 'wait', 'params': [2]},
+            {'methodName': 'fail', 'params': [-2]},
+            {'methodName': 'system.multicall', 'params': [[]]},
+        ])
+        raise tornado.gen.Return(res.value)
+
+    results = run_sync(call_server(dispatcher, call))
+    assert results[:3] == [[1], [2], {'faultCode': -2,
+                                      'faultString': 'Failed'}]
+    assert results[3]['faultCode'] == -32603
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_server_batched_calls(dispatcher, run_sync):
+
+    @tornado.gen.coroutine
+    def call(uri):
+        proxy = ServerProxy(uri, batch_window=0)
+        results = yield [proxy.add(i, i) for i in range(3)]
+        raise tornado.gen.Return([res.value for res in results])
+
+    assert run_sync(call_server(dispatcher, call)) == [0, 2, 4]
+
+
+def test_server_introspection_is_cached(dispatcher):
+    methods = dispatcher.list_methods()
+    assert methods == ['add', 'fail', 'math.div', 'system.listMethods',
+                       'system.methodHelp', 'system.multicall']
+    assert dispatcher.list_methods() is methods
+    assert dispatcher.method_help('add') == "Return sum of a and b."
+    with pytest.raises(Fault):
+        dispatcher.method_help('missing')
+
+    dispatcher.add_method('sub', lambda a, b: a - b)
+    assert 'sub' in dispatcher.list_methods()
+    assert 'system.listMethods' not in Dispatcher(
+        introspection=False).list_methods()
+
+
+def test_server_register_instance():
+
+    class Catalog(object):
+        def getItem(self, item_id):
+            return item_id
+
+        def _private(self):
+            pass
+
+    dispatcher = Dispatcher(introspection=False)
+    dispatcher.register_instance(Catalog(), 'catalog')
+    assert dispatcher.list_methods() == ['catalog.getItem',
+                                         'system.multicall']
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_server_parse_error(dispatcher, run_sync):
+
+    @tornado.gen.coroutine
+    def call(uri):
+        response = yield tornado.httpclient.AsyncHTTPClient().fetch(
+            uri, method='POST', body=b'\xca\x11\x02\x01garbage',
+            headers={'Content-Type': 'application/x-frpc'})
+        raise tornado.gen.Return(response)
+
+    response = run_sync(call_server(dispatcher, call))
+    # Serializer without binary support responds by XML-RPC
+    assert response.headers['Content-Type'] == 'text/xml'
+    with pytest.raises(xmlrpclib.Fault) as exc_info:
+        xmlrpclib.loads(response.body)
+    assert exc_info.value.faultCode == -32700
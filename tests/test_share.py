@@ -0,0 +1,93 @@
+import mock
+import pycurl
+import tornado.curl_httpclient
+
+from tornado_fastrpc.client import ServerProxy
+from tornado_fastrpc.share import CurlShare
+
+from .conftest import XML_RESPONSE
+from .test_transport import RawServer, ok
+
+
+def test_get_resolve():
+    share = CurlShare(resolve={'a.example.com': '10.0.0.1',
+                               'b.example.com:8000': '10.0.0.2',
+                               'b.example.com': '10.0.0.3'})
+    assert share.get_resolve([
+        'http://a.example.com/RPC2',
+        'https://a.example.com/RPC2',
+        'http://a.example.com/RPC2',
+        'http://b.example.com:8000/RPC2',
+        'http://b.example.com:9000/RPC2',
+        'http://c.example.com/RPC2',
+    ]) == [
+        'a.example.com:80:10.0.0.1',
+        'a.example.com:443:10.0.0.1',
+        'b.example.com:8000:10.0.0.2',
+        'b.example.com:9000:10.0.0.3',
+    ]
+
+
+def test_setup():
+    share = CurlShare(dns_cache_timeout=300)
+    c = mock.Mock()
+    share.setup(c, ['a.example.com:80:10.0.0.1'])
+    c.setopt.assert_any_call(pycurl.SHARE, share.share)
+    c.setopt.assert_any_call(pycurl.DNS_CACHE_TIMEOUT, 300)
+    c.setopt.assert_any_call(pycurl.RESOLVE, ['a.example.com:80:10.0.0.1'])
+
+
+def test_share_recreated_after_fork():
+    share = CurlShare()
+    with mock.patch('os.getpid', return_value=100):
+        first = share.share
+        assert share.share is first
+    with mock.patch('os.getpid', return_value=101):
+        assert share.share is not first
+
+
+def test_counters():
+    share = CurlShare()
+    share._on_resolve(pycurl.RESOLVER_START_FUNCTION, None)
+    for local_port in (5000, 5000, 5001, 5000):
+        share._on_connected('10.0.0.1', '10.0.0.2', 80, local_port)
+    assert share.snapshot() == {
+        'requests': 4,
+        'connections': 2,
+        'resolutions': 1,
+        'handshakes_saved': 2,
+        'resolutions_avoided': 3,
+    }
+
+
+def test_proxy_pinned_host(run_sync):
+    server = RawServer([ok(XML_RESPONSE.format(i).encode())
+                        for i in range(3)])
+    share = CurlShare(resolve={'rpc.example': '127.0.0.1'})
+    holder = {}
+
+    async def call():
+        url = await server.start()
+        proxy = holder['proxy'] = ServerProxy(
+            url.replace('127.0.0.1', 'rpc.example'), keep_alive=True,
+            curl_share=share)
+        values = []
+        for _ in range(3):
+            res = await proxy.getData()
+            values.append(res.value)
+        await server.stop(proxy._http_client)
+        return values
+
+    assert run_sync(call) == [0, 1, 2]
+    client = holder['proxy']._http_client_inst
+    assert isinstance(client, tornado.curl_httpclient.CurlAsyncHTTPClient)
+    assert client is not tornado.curl_httpclient.CurlAsyncHTTPClient()
+    assert b'Host: rpc.example' in server.requests[0]
+    assert server.connections == 1
+    assert share.snapshot() == {
+        'requests': 3,
+        'connections': 1,
+        'resolutions': 0,
+        'handshakes_saved': 2,
+        'resolutions_avoided': 3,
+    }
@@ -0,0 +1,145 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import mock
+import pytest
+import tornado.gen
+import tornado.httpclient
+
+import tornado_fastrpc.client
+from tornado_fastrpc.client import ServerProxy
+from tornado_fastrpc.stats import CallTiming, LatencyHistogram, \
+    TimingAggregator
+
+from .conftest import XML_RESPONSE, FakeHTTPClient, make_response
+
+TIME_INFO = {
+    'queue': 0.001,
+    'namelookup': 0.002,
+    'connect': 0.005,
+    'appconnect': 0.012,
+    'pretransfer': 0.013,
+    'starttransfer': 0.053,
+    'total': 0.055,
+}
+
+
+def test_call_timing_phases():
+    timing = CallTiming('foo', 'http://a/', None, 0.001, 0.06, 0.002,
+                        0.063, TIME_INFO)
+    assert timing.success is True
+    assert timing.phases == pytest.approx({
+        'serialize': 0.001,
+        'queue': 0.001,
+        'dns': 0.002,
+        'connect': 0.003,
+        'tls': 0.007,
+        'ttfb': 0.04,
+        'transfer': 0.002,
+        'parse': 0.002,
+        'total': 0.063,
+    })
+
+
+def test_call_timing_queue_of_proxy():
+    timing = CallTiming('foo', 'http://a/', None, 0.001, 0.06, 0.002,
+                        0.073, TIME_INFO, queue=0.01)
+    assert timing.phases['queue'] == pytest.approx(0.011)
+
+
+def test_call_timing_phases_without_time_info():
+    timing = CallTiming('foo', 'http://a/', ValueError(), 0.001, 0.06, None,
+                        0.061, {})
+    assert timing.success is False
+    assert timing.phases == {'serialize': 0.001, 'total': 0.061}
+
+
+def test_histogram():
+    histogram = LatencyHistogram(precision=0.01)
+    assert histogram.percentile(50) is None
+    for i in range(1, 1001):
+        histogram.add(i / 1000.0)
+    assert histogram.count == 1000
+    assert histogram.mean == pytest.approx(0.5005)
+    assert histogram.percentile(50) == pytest.approx(0.5, rel=0.01)
+    assert histogram.percentile(99) == pytest.approx(0.99, rel=0.01)
+    assert histogram.percentile(100) == 1.0
+    assert histogram.snapshot()['p95'] == pytest.approx(0.95, rel=0.01)
+
+
+def test_aggregator():
+    aggregator = TimingAggregator()
+    aggregator(CallTiming('foo', 'http://a/', None, 0.001, 0.06, 0.002,
+                          0.063, TIME_INFO))
+    aggregator(CallTiming('foo', 'http://a/', ValueError(), 0.001, 0.06,
+                          None, 0.061, {}))
+    assert aggregator.errors == {'foo': 1}
+    assert aggregator.histogram('foo').count == 1
+    assert aggregator.histogram('foo', 'ttfb').percentile(50) == \
+        pytest.approx(0.04, rel=0.05)
+    assert aggregator.histogram('bar') is None
+    assert set(aggregator.snapshot()['foo']) == {
+        'serialize', 'queue', 'dns', 'connect', 'tls', 'ttfb', 'transfer',
+        'parse', 'total'}
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_func_observers(run_sync):
+    aggregator = TimingAggregator()
+    observer = mock.Mock()
+    failing = mock.Mock(side_effect=ValueError)
+    proxy = ServerProxy('http://example.com/RPC2',
+                        observers=[failing, aggregator])
+    proxy.add_observer(observer)
+    proxy.fault_cls = xmlrpclib.Fault
+
+    def handler(request):
+        if b'bar' in request.body:
+            raise tornado.httpclient.HTTPError(500, response=make_response(
+                request, code=200, time_info=TIME_INFO))
+        return make_response(request, XML_RESPONSE.format(1),
+                             time_info=TIME_INFO)
+    proxy._http_client_inst = FakeHTTPClient(handler)
+
+    run_sync(proxy.call_func, 'foo')
+    run_sync(proxy.call_func, 'bar', quiet=True)
+
+    assert aggregator.histogram('foo', 'ttfb').count == 1
+    assert aggregator.errors == {'bar': 1}
+    timing = observer.call_args_list[1][0][0]
+    assert timing.method == 'bar'
+    assert timing.uri == 'http://example.com/RPC2'
+    assert timing.exception.code == 500
+    assert timing.time_info == TIME_INFO
+    assert timing.parse is None
+    proxy.remove_observer(observer)
+    assert proxy.observers == [failing, aggregator]
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_call_timing_includes_queue(run_sync):
+    observer = mock.Mock()
+    proxy = ServerProxy('http://example.com/RPC2', max_clients=1,
+                        observers=[observer])
+    proxy.fault_cls = xmlrpclib.Fault
+
+    @tornado.gen.coroutine
+    def handler(request):
+        yield tornado.gen.sleep(0.1)
+        raise tornado.gen.Return(XML_RESPONSE.format(1))
+    proxy._http_client_inst = FakeHTTPClient(handler)
+
+    @tornado.gen.coroutine
+    def call():
+        yield [proxy.call_func('foo'), proxy.call_func('foo')]
+
+    run_sync(call)
+    first, second = sorted((args[0][0] for args in observer.call_args_list),
+                           key=lambda timing: timing.queue)
+    assert first.queue < 0.05
+    # Second call waited for the slot of the first one
+    assert second.queue == pytest.approx(0.1, abs=0.05)
+    assert second.phases['queue'] == second.queue
+    assert second.total == pytest.approx(0.2, abs=0.05)
@@ -0,0 +1,264 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import io
+import zlib
+
+import mock
+import pycurl
+import pytest
+import tornado.gen
+
+import tornado_fastrpc.client
+from tornado_fastrpc.client import Fault, ServerProxy
+from tornado_fastrpc.compression import (Compression, ResponseTooLarge,
+                                         gzip_compress)
+from tornado_fastrpc.streaming import (RequestBody, StreamingDecoder,
+                                       is_streamable, iter_dumps)
+
+from .conftest import XML_RESPONSE, FakeHTTPClient, make_response
+
+RESPONSE = xmlrpclib.dumps(([1, 'abc', {'x': 2.5}],), methodresponse=True)
+FAULT = xmlrpclib.dumps(xmlrpclib.Fault(-500, 'error'), methodresponse=True)
+
+
+def feed(decoder, data, size=7, headers=()):
+    for line in headers:
+        decoder.on_header(line)
+    for i in range(0, len(data), size):
+        decoder.feed(data[i:i + size])
+    return decoder.close()
+
+
+def test_decode_xml():
+    decoder = StreamingDecoder(mock.Mock())
+    assert feed(decoder, RESPONSE.encode()) == [1, 'abc', {'x': 2.5}]
+    assert decoder.size == decoder.received == len(RESPONSE)
+
+
+def test_decode_fault():
+    with pytest.raises(xmlrpclib.Fault):
+        feed(StreamingDecoder(mock.Mock()), FAULT.encode())
+
+
+@pytest.mark.parametrize('encoding, wbits', [
+    ('gzip', 16 + zlib.MAX_WBITS),
+    ('deflate', zlib.MAX_WBITS),
+    ('deflate', -zlib.MAX_WBITS),
+])
+def test_decode_compressed(encoding, wbits):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    data = compressor.compress(RESPONSE.encode()) + compressor.flush()
+    decoder = StreamingDecoder(mock.Mock())
+    headers = ['HTTP/1.1 200 OK\r\n',
+               'Content-Encoding: {}\r\n'.format(encoding)]
+    assert feed(decoder, data, headers=headers) == [1, 'abc', {'x': 2.5}]
+    assert decoder.received == len(data)
+    assert decoder.size == len(RESPONSE)
+
+
+@pytest.mark.parametrize('wbits', [16 + zlib.MAX_WBITS, zlib.MAX_WBITS])
+def test_decode_compressed_before_headers(wbits):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    data = compressor.compress(RESPONSE.encode()) + compressor.flush()
+    decoder = StreamingDecoder(mock.Mock())
+    assert feed(decoder, data) == [1, 'abc', {'x': 2.5}]
+    assert decoder.size == len(RESPONSE)
+
+
+def test_decode_too_large():
+    decoder = StreamingDecoder(mock.Mock(), max_size=100)
+    data = gzip_compress(RESPONSE.encode() * 10, 9)
+    with pytest.raises(ResponseTooLarge):
+        feed(decoder, data, headers=['Content-Encoding: gzip\r\n'])
+    assert decoder.size <= 101
+    # Rest of the body is dropped
+    assert decoder.write(b'x') is False
+    with pytest.raises(ResponseTooLarge):
+        decoder.close()
+
+
+def test_decode_binary_is_buffered():
+    loads = mock.Mock(return_value='value')
+    decoder = StreamingDecoder(loads)
+    data = b'\xca\x11\x02\x01' + b'x' * 20
+    assert feed(decoder, data) == 'value'
+    loads.assert_called_once_with(data)
+
+
+def streaming_handler(body, headers=()):
+
+    def handler(request):
+        for line in ('HTTP/1.1 200 OK',) + tuple(headers):
+            request.header_callback(line + '\r\n')
+        for i in range(0, len(body), 16):
+            request.streaming_callback(body[i:i + 16])
+        return make_response(request, b'', headers=dict(
+            line.split(': ') for line in headers))
+    return handler
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_proxy_streaming(run_sync):
+    compression = Compression()
+    proxy = ServerProxy('http://example.com/RPC2', streaming=True,
+                        compression=compression)
+    proxy.fault_cls = xmlrpclib.Fault
+    data = gzip_compress(RESPONSE.encode(), 6)
+    proxy._http_client_inst = FakeHTTPClient(
+        streaming_handler(data, ['Content-Encoding: gzip']))
+
+    res = run_sync(proxy.getData)
+    assert res.value == [1, 'abc', {'x': 2.5}]
+    request = proxy._http_client_inst.requests[0]
+    assert request.decompress_response is False
+    assert compression.snapshot()['getData'] == {
+        'request_raw': len(xmlrpclib.dumps((), 'getData')),
+        'request_sent': len(xmlrpclib.dumps((), 'getData')),
+        'response_received': len(data),
+        'response_raw': len(RESPONSE),
+    }
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_proxy_streaming_fault(run_sync):
+    proxy = ServerProxy('http://example.com/RPC2', streaming=True)
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(
+        streaming_handler(FAULT.encode()))
+
+    res = run_sync(proxy.getData, quiet=True)
+    assert isinstance(res.exception, Fault)
+    assert res.exception.faultCode == -500
+
+
+@pytest.mark.parametrize('streaming', [True, False])
+def test_proxy_max_response_size(run_sync, streaming):
+    proxy = ServerProxy('http://example.com/RPC2', streaming=streaming,
+                        max_response_size=100)
+    proxy.fault_cls = xmlrpclib.Fault
+    body = RESPONSE.encode() * 2
+    if streaming:
+        handler = streaming_handler(body)
+    else:
+        handler = lambda request: body  # noqa: E731
+    proxy._http_client_inst = FakeHTTPClient(handler)
+
+    res = run_sync(proxy.getData, quiet=True)
+    assert isinstance(res.exception, ResponseTooLarge)
+
+
+@pytest.mark.parametrize('args', [
+    (),
+    (1, 'a<b', None, 2.5, [1, [2, {'x': True}]]),
+    ({'data': xmlrpclib.Binary(b'abc'), 'list': list(range(100))},),
+])
+def test_iter_dumps_is_equal_to_dumps(args):
+    expected = xmlrpclib.dumps(args, 'foo', allow_none=True).encode()
+    assert b''.join(iter_dumps(args, 'foo', chunk_size=10)) == expected
+
+
+def test_iter_dumps_streamable_values():
+    data = bytes(bytearray(range(256))) * 100
+    args = (iter(range(3)), io.BytesIO(data), memoryview(data),
+            {'x': (i * 2 for i in range(2))})
+    assert is_streamable(args) is True
+    chunks = list(iter_dumps(args, 'foo', chunk_size=1024))
+    assert len(chunks) > 1
+    params, name = xmlrpclib.loads(b''.join(chunks))
+    assert name == 'foo'
+    assert params[0] == [0, 1, 2]
+    assert params[1].data == data
+    assert params[2].data == data
+    assert params[3] == {'x': [0, 2]}
+
+
+def test_is_streamable():
+    assert is_streamable((1, 'abc', [b'x'], {'y': None})) is False
+    assert is_streamable(([[memoryview(b'x')]],)) is True
+
+
+def test_request_body_read():
+    body = RequestBody([b'abc', b'defgh', b'i'])
+    assert body.read(4) == b'abcd'
+    assert body.read(10) == b'efghi'
+    assert body.read(10) == b''
+    assert body.size == 9
+
+
+def test_request_body_produce(run_sync):
+    written = []
+
+    @tornado.gen.coroutine
+    def write(chunk):
+        written.append(chunk)
+
+    body = RequestBody([b'abc', b'de'])
+    run_sync(body.produce, write)
+    assert written == [b'abc', b'de']
+    assert body.size == 5
+
+
+def producing_handler(requests):
+
+    @tornado.gen.coroutine
+    def handler(request):
+        chunks = []
+
+        @tornado.gen.coroutine
+        def write(chunk):
+            chunks.append(chunk)
+
+        if request.body_producer is None:
+            chunks.append(request.body)
+        else:
+            yield request.body_producer(write)
+        requests.append(b''.join(chunks))
+        raise tornado.gen.Return(XML_RESPONSE.format(1))
+    return handler
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_proxy_stream_request(run_sync):
+    bodies = []
+    proxy = ServerProxy('http://example.com/RPC2', stream_threshold=1000)
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(producing_handler(bodies))
+
+    assert run_sync(proxy.getData, 1).value == 1
+    assert run_sync(proxy.getData, iter([1, 2])).value == 1
+    assert run_sync(proxy.getData, 'x' * 2000).value == 1
+
+    requests = proxy._http_client_inst.requests
+    assert requests[0].body_producer is None
+    assert 'Transfer-Encoding' not in requests[0].headers
+    assert requests[1].headers['Transfer-Encoding'] == 'chunked'
+    assert xmlrpclib.loads(bodies[1]) == (([1, 2],), 'getData')
+    assert xmlrpclib.loads(bodies[2]) == (('x' * 2000,), 'getData')
+
+    curl = mock.Mock()
+    requests[1].prepare_curl_callback(curl)
+    curl.setopt.assert_any_call(pycurl.POSTFIELDSIZE, -1)
+    curl.setopt.assert_any_call(pycurl.HTTP_VERSION,
+                                pycurl.CURL_HTTP_VERSION_1_1)
+
+
+@mock.patch.object(tornado_fastrpc.client, 'fastrpc', new=None)
+def test_proxy_stream_compressed_request(run_sync):
+    bodies = []
+    compression = Compression()
+    proxy = ServerProxy('http://example.com/RPC2', stream_threshold=0,
+                        compression=compression)
+    proxy.fault_cls = xmlrpclib.Fault
+    proxy._http_client_inst = FakeHTTPClient(producing_handler(bodies))
+
+    assert run_sync(proxy.getData, ['abc'] * 1000).value == 1
+    request = proxy._http_client_inst.requests[0]
+    assert request.headers['Content-Encoding'] == 'gzip'
+    body = zlib.decompress(bodies[0], 16 + zlib.MAX_WBITS)
+    assert xmlrpclib.loads(body) == ((['abc'] * 1000,), 'getData')
+    stats = compression.snapshot()['getData']
+    assert stats['request_raw'] == len(body)
+    assert stats['request_sent'] == len(bodies[0])
@@ -0,0 +1,418 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+import asyncio
+import time
+
+import mock
+import pytest
+import tornado.curl_httpclient
+import tornado.httpclient
+
+from tornado_fastrpc.client import Result, ServerProxy
+from tornado_fastrpc.compression import ResponseTooLarge, gzip_compress
+from tornado_fastrpc.transport import AsyncioHTTPClient
+
+from .conftest import XML_RESPONSE
+
+
+class RawServer(object):
+    """
+    HTTP server, *responses* are raw responses sent to the requests.
+    """
+
+    def __init__(self, responses, close_after=None):
+        self.responses = list(responses)
+        self.close_after = close_after
+        self.requests = []
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        served = 0
+        while self.responses:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except asyncio.IncompleteReadError:
+                break
+            length = 0
+            chunked = False
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+                elif line.lower() == b'transfer-encoding: chunked':
+                    chunked = True
+            if chunked:
+                body = b''
+                while True:
+                    size = int(await reader.readuntil(b'\r\n'), 16)
+                    body += (await reader.readexactly(size + 2))[:-2]
+                    if not size:
+                        break
+                self.requests.append(head + body)
+            else:
+                self.requests.append(head + await reader.readexactly(length))
+            writer.write(self.responses.pop(0))
+            await writer.drain()
+            served += 1
+            if served == self.close_after:
+                break
+        writer.close()
+
+    async def stop(self, client):
+        client.close()
+        self.server.close()
+        # Let handlers see closed connections
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+    async def start(self, unix_socket=None):
+        if unix_socket is not None:
+            self.server = await asyncio.start_unix_server(
+                self.handle, unix_socket)
+            return 'unix://' + unix_socket
+        self.server = await asyncio.start_server(
+            self.handle, '127.0.0.1', 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return 'http://127.0.0.1:{}/RPC2'.format(port)
+
+
+def ok(body, extra=b''):
+    return (b'HTTP/1.1 200 OK\r\n' + extra +
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' +
+            body)
+
+
+def request(url, body=b'<x/>', **kwargs):
+    return tornado.httpclient.HTTPRequest(
+        url, method='POST', body=body,
+        headers={'Expect': '100-continue', 'Accept-Encoding': ''}, **kwargs)
+
+
+def test_fetch_keep_alive(run_sync):
+    server = RawServer([ok(b'first'), ok(b'second')])
+    client = AsyncioHTTPClient()
+
+    async def fetch():
+        url = await server.start()
+        res = [(await client.fetch(request(url))).body for _ in range(2)]
+        await server.stop(client)
+        return res
+
+    assert run_sync(fetch) == [b'first', b'second']
+    assert server.connections == 1
+    req = server.requests[0]
+    assert req.startswith(b'POST /RPC2 HTTP/1.1\r\n')
+    assert b'Host: 127.0.0.1:' in req
+    assert b'Expect' not in req
+    assert b'Accept-Encoding' not in req
+    assert req.endswith(b'Content-Length: 4\r\n\r\n<x/>')
+
+
+def test_fetch_chunked_and_continue(run_sync):
+    server = RawServer([
+        b'HTTP/1.1 100 Continue\r\n\r\n'
+        b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+        b'3\r\nabc\r\n2;x=y\r\nde\r\n0\r\n\r\n',
+        ok(b'next')])
+    client = AsyncioHTTPClient()
+
+    async def fetch():
+        url = await server.start()
+        res = [(await client.fetch(request(url))).body for _ in range(2)]
+        await server.stop(client)
+        return res
+
+    assert run_sync(fetch) == [b'abcde', b'next']
+    assert server.connections == 1
+
+
+def test_fetch_streaming(run_sync):
+    server = RawServer([
+        ok(b'abcdef', b'Content-Type: text/xml\r\n'),
+        b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+        b'3\r\nabc\r\n2\r\nde\r\n0\r\n\r\n'])
+    client = AsyncioHTTPClient()
+    chunks = []
+    header_lines = []
+
+    async def fetch():
+        url = await server.start()
+        res = []
+        for _ in range(2):
+            res.append((await client.fetch(request(
+                url, streaming_callback=chunks.append,
+                header_callback=header_lines.append))).body)
+        await server.stop(client)
+        return res
+
+    assert run_sync(fetch) == [b'', b'']
+    assert b''.join(chunks) == b'abcdefabcde'
+    assert header_lines[:4] == ['HTTP/1.1 200 OK\r\n',
+                                'Content-Type: text/xml\r\n',
+                                'Content-Length: 6\r\n', '\r\n']
+    assert server.connections == 1
+
+
+def test_fetch_body_producer(run_sync):
+    server = RawServer([ok(b'a')])
+    client = AsyncioHTTPClient()
+
+    async def producer(write):
+        for chunk in (b'<x>', b'', b'</x>'):
+            await write(chunk)
+
+    async def fetch():
+        url = await server.start()
+        res = (await client.fetch(request(
+            url, body=None, body_producer=producer))).body
+        await server.stop(client)
+        return res
+
+    assert run_sync(fetch) == b'a'
+    req = server.requests[0]
+    assert b'Transfer-Encoding: chunked\r\n' in req
+    assert b'Content-Length' not in req
+    assert req.endswith(b'\r\n\r\n<x></x>')
+
+
+def test_fetch_connection_close(run_sync):
+    server = RawServer([ok(b'a', b'Connection: close\r\n'), ok(b'b')])
+    client = AsyncioHTTPClient()
+
+    async def fetch():
+        url = await server.start()
+        res = [(await client.fetch(request(url))).body for _ in range(2)]
+        await server.stop(client)
+        return res
+
+    assert run_sync(fetch) == [b'a', b'b']
+    assert server.connections == 2
+
+
+def test_fetch_retry_stale_connection(run_sync):
+    server = RawServer([ok(b'a'), ok(b'b')], close_after=1)
+    client = AsyncioHTTPClient()
+
+    async def fetch():
+        url = await server.start()
+        first = await client.fetch(request(url))
+        await asyncio.sleep(0.01)
+        second = await client.fetch(request(url))
+        await server.stop(client)
+        return [first.body, second.body]
+
+    assert run_sync(fetch) == [b'a', b'b']
+    assert server.connections == 2
+
+
+def test_fetch_http_error(run_sync):
+    server = RawServer([
+        b'HTTP/1.1 503 Unavailable\r\nContent-Length: 0\r\n\r\n', ok(b'b')])
+    client = AsyncioHTTPClient()
+
+    async def fetch():
+        url = await server.start()
+        with pytest.raises(tornado.httpclient.HTTPError) as exc_info:
+            await client.fetch(request(url))
+        assert exc_info.value.code == 503
+        res = (await client.fetch(request(url))).body
+        await server.stop(client)
+        return res
+
+    assert run_sync(fetch) == b'b'
+    assert server.connections == 1
+
+
+def test_fetch_timeout(run_sync):
+    server = RawServer([])
+    client = AsyncioHTTPClient()
+
+    async def fetch():
+        url = await server.start()
+        try:
+            await client.fetch(request(url, request_timeout=0.05))
+        finally:
+            await server.stop(client)
+
+    with pytest.raises(tornado.httpclient.HTTPError) as exc_info:
+        run_sync(fetch)
+    assert exc_info.value.code == 599
+
+
+def test_fetch_pool_limit(run_sync):
+    server = RawServer([ok(str(i).encode()) for i in range(4)])
+    client = AsyncioHTTPClient(max_clients=2)
+
+    async def fetch():
+        url = await server.start()
+        responses = await asyncio.gather(
+            *[client.fetch(request(url)) for _ in range(4)])
+        await server.stop(client)
+        return sorted(r.body for r in responses)
+
+    assert run_sync(fetch) == [b'0', b'1', b'2', b'3']
+    assert server.connections == 2
+
+
+def test_fetch_idle_eviction(run_sync):
+    server = RawServer([ok(b'a'), ok(b'b')])
+    client = AsyncioHTTPClient(idle_timeout=0.0)
+
+    async def fetch():
+        url = await server.start()
+        await client.fetch(request(url))
+        await client.fetch(request(url))
+        await server.stop(client)
+
+    run_sync(fetch)
+    assert server.connections == 2
+
+
+def test_fetch_idle_sweep(run_sync):
+    server = RawServer([ok(b'a')])
+    client = AsyncioHTTPClient(idle_timeout=0.01)
+
+    async def fetch():
+        url = await server.start()
+        await client.fetch(request(url))
+        pool, = client._pools.values()
+        assert pool.size == 1
+        # Host isn't called again, the connection is closed by the sweep
+        await asyncio.sleep(0.05)
+        size = pool.size
+        await server.stop(client)
+        return size
+
+    assert run_sync(fetch) == 0
+
+
+def test_server_proxy(run_sync):
+    server = RawServer([ok(XML_RESPONSE.format(42).encode())])
+    holder = {}
+
+    async def call():
+        url = await server.start()
+        proxy = holder['proxy'] = ServerProxy(
+            url, http_client_cls=AsyncioHTTPClient)
+        res = await proxy.getData(1)
+        await server.stop(proxy._http_client)
+        return res
+
+    assert run_sync(call) == Result(True, 42, None)
+    assert isinstance(holder['proxy']._http_client, AsyncioHTTPClient)
+
+
+@pytest.mark.parametrize('http_client_cls', [
+    AsyncioHTTPClient, tornado.curl_httpclient.CurlAsyncHTTPClient])
+def test_server_proxy_unix_socket(run_sync, tmpdir, http_client_cls):
+    server = RawServer([ok(XML_RESPONSE.format(i).encode())
+                        for i in range(2)])
+
+    async def call():
+        uri = await server.start(str(tmpdir.join('rpc.sock')))
+        proxy = ServerProxy(uri, keep_alive=True,
+                            http_client_cls=http_client_cls)
+        values = []
+        for _ in range(2):
+            res = await proxy.getData()
+            values.append(res.value)
+        await server.stop(proxy._http_client)
+        return values
+
+    assert run_sync(call) == [0, 1]
+    assert server.requests[0].startswith(b'POST /RPC2 HTTP/1.')
+    assert b'Host: localhost' in server.requests[0]
+    assert server.connections == 1
+
+
+def test_server_proxy_unix_socket_option(run_sync, tmpdir):
+    server = RawServer([ok(XML_RESPONSE.format(1).encode())])
+
+    async def call():
+        await server.start(str(tmpdir.join('rpc.sock')))
+        proxy = ServerProxy('http://rpc.example.com/API',
+                            unix_socket=str(tmpdir.join('rpc.sock')),
+                            http_client_cls=AsyncioHTTPClient)
+        res = await proxy.getData()
+        await server.stop(proxy._http_client)
+        return res
+
+    assert run_sync(call) == Result(True, 1, None)
+    assert server.requests[0].startswith(b'POST /API HTTP/1.')
+    assert b'Host: rpc.example.com' in server.requests[0]
+
+
+def test_server_proxy_unix_socket_and_tcp(run_sync, tmpdir):
+    unix_server = RawServer([ok(XML_RESPONSE.format(1).encode())])
+    tcp_server = RawServer([ok(XML_RESPONSE.format(2).encode())])
+
+    async def call():
+        sock = str(tmpdir.join('rpc.sock'))
+        await unix_server.start(sock)
+        url = await tcp_server.start()
+        proxy = ServerProxy(
+            ['unix://rpc.example.com{}:/API'.format(sock), url],
+            max_clients=1,
+            http_client_cls=tornado.curl_httpclient.CurlAsyncHTTPClient)
+        unix, tcp = proxy.balancer.endpoints
+        values = []
+        # Curl handle used for Unix socket isn't used for TCP
+        for endpoint in (unix, tcp):
+            with mock.patch.object(proxy.balancer, 'select',
+                                   return_value=endpoint):
+                res = await proxy.getData()
+            values.append(res.value)
+        await unix_server.stop(proxy._unix_http_client)
+        await tcp_server.stop(proxy._http_client)
+        return values, tcp.healthy
+
+    assert run_sync(call) == ([1, 2], True)
+    assert unix_server.requests[0].startswith(b'POST /API HTTP/1.')
+    assert b'Host: rpc.example.com' in unix_server.requests[0]
+    assert tcp_server.requests[0].startswith(b'POST /RPC2 HTTP/1.')
+
+
+@pytest.mark.parametrize('http_client_cls', [
+    AsyncioHTTPClient, tornado.curl_httpclient.CurlAsyncHTTPClient])
+def test_server_proxy_streaming_gzip(run_sync, http_client_cls):
+    value = ['abc'] * 1000
+    body = gzip_compress(
+        xmlrpclib.dumps((value,), methodresponse=True).encode(), 6)
+    server = RawServer([ok(body, b'Content-Encoding: gzip\r\n')])
+
+    async def call():
+        url = await server.start()
+        proxy = ServerProxy(url, streaming=True,
+                            http_client_cls=http_client_cls)
+        res = await proxy.getData()
+        await server.stop(proxy._http_client)
+        return res
+
+    assert run_sync(call) == Result(True, value, None)
+
+
+@pytest.mark.parametrize('http_client_cls', [
+    AsyncioHTTPClient, tornado.curl_httpclient.CurlAsyncHTTPClient])
+def test_server_proxy_streaming_aborts_large_response(run_sync,
+                                                      http_client_cls):
+    # Server sends only beginning of the body and waits
+    server = RawServer([
+        b'HTTP/1.1 200 OK\r\nContent-Length: 100000000\r\n\r\n' +
+        b'x' * 300000])
+
+    async def call():
+        url = await server.start()
+        proxy = ServerProxy(url, streaming=True, max_response_size=1000,
+                            timeout=5.0, http_client_cls=http_client_cls)
+        start = time.time()
+        res = await proxy.getData(quiet=True)
+        duration = time.time() - start
+        await server.stop(proxy._http_client)
+        return res, duration
+
+    res, duration = run_sync(call)
+    assert isinstance(res.exception, ResponseTooLarge)
+    assert duration < 1.0
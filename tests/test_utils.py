@@ -0,0 +1,23 @@
+try:
+    import xmlrpclib
+except ImportError:
+    import xmlrpc.client as xmlrpclib
+
+from tornado_fastrpc.utils import estimate_size, make_key
+
+
+def test_make_key():
+    assert make_key('foo', ({'a': 1, 'b': [1, 2]},)) == \
+        make_key('foo', [{'b': (1, 2), 'a': 1}])
+    assert make_key('foo', (1,)) != make_key('bar', (1,))
+    assert make_key('foo', (1,)) != make_key('foo', (True,))
+    assert make_key('foo', (1,)) != make_key('foo', (1.0,))
+    assert make_key('foo', (xmlrpclib.Binary(b'abc'),)) == \
+        make_key('foo', (xmlrpclib.Binary(b'abc'),))
+    hash(make_key('foo', ({'a': [None, object()]},)))
+
+
+def test_estimate_size():
+    assert estimate_size('x' * 100) == 108
+    assert estimate_size([b'x' * 100, {'ab': 1}]) == 8 + 108 + 8 + 10 + 16
+    assert estimate_size(['x' * 100] * 100, limit=500) < 1000
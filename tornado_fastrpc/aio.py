@@ -0,0 +1,90 @@
+"""
+Native coroutine API of the :class:`~tornado_fastrpc.client.ServerProxy`.
+
+:class:`AsyncServerProxy` has the same constructor and features as
+:class:`~tornado_fastrpc.client.ServerProxy`, but :meth:`call_func` is
+native coroutine and method objects are cached, so a call doesn't go
+through :func:`tornado.gen.coroutine` wrapper nor creates new objects for
+dotted names. Call which needs none of the optional features is sent
+directly by :meth:`~AsyncServerProxy.call_func`. It runs on asyncio
+event loop (Tornado 5+)::
+
+    proxy = AsyncServerProxy('http://example.com/RPC2')
+
+    async def handler():
+        res = await proxy.catalog.getItem(123)
+"""
+
+from tornado_fastrpc.client import Result, ServerProxy
+
+__all__ = ['AsyncMethod', 'AsyncServerProxy']
+
+
+class AsyncMethod(object):
+    """
+    RPC method *name* of the *proxy*, attributes are cached methods with
+    dotted names.
+    """
+
+    __slots__ = ('_proxy', '_name', '_children')
+
+    def __init__(self, proxy, name):
+        self._proxy = proxy
+        self._name = name
+        self._children = {}
+
+    def __call__(self, *args, quiet=False, priority=0, deadline=None,
+                 raw=False):
+        return self._proxy.call_func(self._name, *args, quiet=quiet,
+                                     priority=priority, deadline=deadline,
+                                     raw=raw)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        method = self._children.get(name)
+        if method is None:
+            method = self._children[name] = AsyncMethod(
+                self._proxy, '{}.{}'.format(self._name, name))
+        return method
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self._name)
+
+
+class AsyncServerProxy(ServerProxy):
+    """
+    :class:`~tornado_fastrpc.client.ServerProxy` with native coroutine
+    API.
+    """
+
+    async def call_func(self, name, *args, quiet=False, priority=0,
+                        deadline=None, raw=False):
+        """
+        Call RPC function *name* with arguments *args*, see
+        :meth:`tornado_fastrpc.client.ServerProxy.call_func`.
+
+        ::
+
+            res = await proxy.call_func('div', 4, 2)
+        """
+        try:
+            if self._is_plain():
+                result_data = await self._call_plain(name, args, priority,
+                                                     deadline, raw)
+            else:
+                result_data = await self._call(name, args, priority,
+                                               deadline, raw)
+        except Exception as e:
+            if quiet:
+                return Result(False, None, e)
+            raise
+        return Result(True, result_data, None)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        method = AsyncMethod(self, name)
+        # Next lookup finds the method in the instance dict
+        self.__dict__[name] = method
+        return method
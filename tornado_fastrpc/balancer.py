@@ -0,0 +1,146 @@
+"""
+Client side load balancing between replicas of the RPC backend.
+
+:class:`Balancer` routes every call to the replica with the fewest in-flight
+calls (``least_outstanding``) or to the replica with the lowest EWMA latency
+weighted by its in-flight calls (``ewma``). Replicas which fail repeatedly
+are ejected and :class:`~tornado_fastrpc.client.ServerProxy` brings them
+back when a probe succeeds.
+"""
+
+import random
+try:
+    import urllib.parse as urlparse
+except ImportError:
+    import urlparse
+
+__all__ = ['Balancer', 'Endpoint']
+
+
+# Host and path of the requests to the replica given by
+# ``unix:///path/to/socket`` URI without them
+UNIX_SOCKET_HOST = 'localhost'
+UNIX_SOCKET_PATH = '/RPC2'
+
+
+class Endpoint(object):
+    """
+    One replica of the backend. *url* is HTTP URL of the requests, it
+    differs from *uri* for ``unix://host/path/to/socket:/path`` URIs,
+    requests are then sent over Unix socket *unix_socket*. Host and path
+    of the requests are optional (``localhost`` and ``/RPC2``).
+    """
+
+    def __init__(self, uri, unix_socket=None):
+        self.uri = uri
+        parsed = urlparse.urlparse(uri)
+        if parsed.scheme == 'unix':
+            # Path of the socket is separated from path of the requests
+            # by colon
+            unix_socket, _, path = parsed.path.partition(':')
+            self.url = 'http://{}{}'.format(parsed.netloc or UNIX_SOCKET_HOST,
+                                            path or UNIX_SOCKET_PATH)
+            self.unix_socket = unix_socket
+        else:
+            self.url = uri
+            self.unix_socket = unix_socket
+        self.host = urlparse.urlparse(self.url).netloc
+        self.in_flight = 0
+        self.latency = None
+        self.failures = 0
+        self.healthy = True
+        self.breaker = None
+
+    @property
+    def available(self):
+        return self.healthy and (self.breaker is None or
+                                 not self.breaker.is_open)
+
+    def __repr__(self):
+        return "<{} {} in_flight={} latency={} healthy={}>".format(
+            self.__class__.__name__, self.uri, self.in_flight,
+            self.latency, self.healthy
+        )
+
+
+class Balancer(object):
+    """
+    Chooses :class:`Endpoint` for each call.
+    """
+
+    strategies = ('least_outstanding', 'ewma')
+
+    def __init__(self, uris, strategy='least_outstanding', max_failures=3,
+                 ewma_alpha=0.3):
+        """
+        :arg list uris: URL addresses of the replicas
+        :arg string strategy: ``least_outstanding`` or ``ewma``
+        :arg int max_failures: Number of consecutive failures after which
+            replica is ejected
+        :arg float ewma_alpha: Weight of the last latency sample
+        """
+        if not uris:
+            raise ValueError("At least one URI is required")
+        if strategy not in self.strategies:
+            raise ValueError("Unknown strategy '{}'".format(strategy))
+        self.endpoints = [Endpoint(uri) for uri in uris]
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.ewma_alpha = ewma_alpha
+
+    def _score(self, endpoint):
+        if self.strategy == 'ewma':
+            # Replicas without latency sample get score 0, so they are
+            # tried first
+            return (endpoint.latency or 0.0) * (endpoint.in_flight + 1)
+        return endpoint.in_flight
+
+    def select(self, exclude=()):
+        """
+        Return the best :class:`Endpoint`. Endpoints in *exclude* are
+        skipped unless there is no other choice. If all replicas are
+        ejected or their circuit breakers are open, they are used rather
+        than failing the call.
+        """
+        candidates = [e for e in self.endpoints if e not in exclude] or \
+            self.endpoints
+        available = [e for e in candidates if e.available]
+        if available:
+            candidates = available
+        if len(candidates) == 1:
+            return candidates[0]
+        # Shuffle, so ties are not always resolved to the first replica
+        candidates = random.sample(candidates, len(candidates))
+        return min(candidates, key=self._score)
+
+    def on_start(self, endpoint):
+        endpoint.in_flight += 1
+
+    def on_success(self, endpoint, latency):
+        endpoint.in_flight -= 1
+        endpoint.failures = 0
+        if endpoint.latency is None:
+            endpoint.latency = latency
+        else:
+            endpoint.latency = (self.ewma_alpha * latency +
+                                (1.0 - self.ewma_alpha) * endpoint.latency)
+
+    def on_cancel(self, endpoint):
+        endpoint.in_flight -= 1
+
+    def on_failure(self, endpoint):
+        """
+        Register failed call. Return :const:`True` if *endpoint* has just
+        been ejected. The only replica is never ejected.
+        """
+        endpoint.in_flight -= 1
+        endpoint.failures += 1
+        if (endpoint.healthy and len(self.endpoints) > 1 and
+                endpoint.failures >= self.max_failures):
+            endpoint.healthy = False
+            return True
+        return False
+
+    def reinstate(self, endpoint):
+        endpoint.failures = 0
+        endpoint.healthy = True
@@ -0,0 +1,109 @@
+"""
+Batching of the RPC calls into ``system.multicall`` requests.
+"""
+
+import time
+
+import tornado.concurrent
+import tornado.gen
+import tornado.ioloop
+
+from tornado_fastrpc.limiter import DeadlineExceeded
+
+__all__ = ['Batcher']
+
+
+class Batcher(object):
+    """
+    Collects calls issued within *window* seconds (or within one IOLoop
+    iteration if *window* is ``0``), at most *max_size* calls, and sends
+    them as one ``system.multicall`` request.
+
+    Batch gets the highest priority and the latest deadline of its calls,
+    calls whose deadline passed are dropped before the batch is sent.
+    """
+
+    def __init__(self, proxy, window=0.0, max_size=50):
+        """
+        :arg proxy: :class:`~tornado_fastrpc.client.ServerProxy` instance
+        :arg float window: Time in seconds for collecting calls
+        :arg int max_size: Maximal number of calls in one batch
+        """
+        self._proxy = proxy
+        self.window = window
+        self.max_size = max_size
+        self._pending = []
+        self._timeout = None
+        self._scheduled = False
+
+    def add(self, name, args, priority=0, deadline=None):
+        """
+        Enqueue call, return future which resolves into the call's
+        return value.
+        """
+        future = tornado.concurrent.Future()
+        self._pending.append((name, args, future, priority, deadline))
+        if len(self._pending) >= self.max_size:
+            self.flush()
+        elif not self._scheduled:
+            self._scheduled = True
+            io_loop = tornado.ioloop.IOLoop.current()
+            if self.window:
+                self._timeout = io_loop.call_later(self.window, self.flush)
+            else:
+                io_loop.add_callback(self.flush)
+        return future
+
+    def flush(self):
+        """
+        Send all pending calls immediately.
+        """
+        if self._timeout is not None:
+            tornado.ioloop.IOLoop.current().remove_timeout(self._timeout)
+            self._timeout = None
+        self._scheduled = False
+        pending, self._pending = self._pending, []
+        now = time.time()
+        live = []
+        for call in pending:
+            deadline = call[4]
+            if deadline is not None and deadline <= now:
+                call[2].set_exception(DeadlineExceeded(
+                    "Deadline passed before call was sent"))
+            else:
+                live.append(call)
+        if live:
+            deadlines = [call[4] for call in live]
+            self._send([call[:3] for call in live],
+                       max(call[3] for call in live),
+                       None if None in deadlines else max(deadlines))
+
+    @tornado.gen.coroutine
+    def _send(self, calls, priority=0, deadline=None):
+        proxy = self._proxy
+        try:
+            if len(calls) == 1:
+                name, args, future = calls[0]
+                results = [[(yield proxy._call_remote(
+                    name, args, priority, deadline))]]
+            else:
+                params = [{'methodName': name, 'params': list(args)}
+                          for name, args, future in calls]
+                results = yield proxy._call_remote(
+                    'system.multicall', (params,), priority, deadline)
+                if len(results) != len(calls):
+                    raise ValueError(
+                        "system.multicall returned {} results for {} "
+                        "calls".format(len(results), len(calls)))
+        except Exception as e:
+            for name, args, future in calls:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (name, args, future), result in zip(calls, results):
+            if future.done():
+                continue
+            if isinstance(result, dict):
+                future.set_exception(proxy._fault_from_struct(result))
+            else:
+                future.set_result(result[0])
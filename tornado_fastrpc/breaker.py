@@ -0,0 +1,170 @@
+"""
+Circuit breaker, which fails calls to a dead replica immediately instead of
+letting them wait for connection timeout.
+
+::
+
+    def alert(breaker, old_state, new_state):
+        logging.warning("%s: %s -> %s", breaker.uri, old_state, new_state)
+
+    proxy = ServerProxy(
+        'http://example.com/RPC2',
+        circuit_breaker=functools.partial(CircuitBreaker,
+                                          on_state_change=alert))
+"""
+
+import collections
+import time
+
+__all__ = ['CircuitBreaker', 'CircuitOpenError']
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """
+    Call wasn't made, because circuit breaker of the replica is open.
+    """
+
+    def __init__(self, uri):
+        super(CircuitOpenError, self).__init__(
+            "Circuit breaker of {} is open".format(uri))
+        self.uri = uri
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker of one replica.
+
+    * **closed** calls pass, breaker opens when rate of the failed calls
+      reaches *failure_rate* or rate of the calls slower than
+      *slow_call_duration* reaches *slow_call_rate* within the last
+      *window* seconds (at least *min_calls* calls are required)
+    * **open** calls fail immediately with :exc:`CircuitOpenError`, after
+      *open_time* seconds breaker becomes half-open
+    * **half-open** at most *half_open_calls* trial calls pass, breaker
+      closes if all of them succeed, else it opens again
+
+    *on_state_change* is called with the breaker, old state and new state.
+    """
+
+    def __init__(self, uri, failure_rate=0.5, slow_call_duration=None,
+                 slow_call_rate=1.0, window=10.0, min_calls=20,
+                 open_time=5.0, half_open_calls=1, on_state_change=None):
+        """
+        :arg string uri: URI of the replica
+        :arg float failure_rate: Rate of the failed calls (0-1) which
+            opens breaker
+        :arg float slow_call_duration: Duration in seconds of the slow call,
+            :const:`None` disables latency checking
+        :arg float slow_call_rate: Rate of the slow calls (0-1) which
+            opens breaker
+        :arg float window: Length of the rolling window in seconds
+        :arg int min_calls: Minimal number of calls in the window for
+            opening breaker
+        :arg float open_time: Time in seconds before trial calls
+        :arg int half_open_calls: Number of trial calls
+        :arg on_state_change: Callable ``(breaker, old_state, new_state)``
+        """
+        self.uri = uri
+        self.failure_rate = failure_rate
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate = slow_call_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.open_time = open_time
+        self.half_open_calls = half_open_calls
+        self.on_state_change = on_state_change
+        self.state = CLOSED
+        self._opened_at = None
+        self._trials = 0
+        self._trial_successes = 0
+        # Window is split into 10 buckets [start, calls, failures, slow]
+        self._bucket_length = window / 10.0
+        self._buckets = collections.deque()
+
+    def _set_state(self, state):
+        old_state, self.state = self.state, state
+        if state == OPEN:
+            self._opened_at = time.time()
+        elif state == HALF_OPEN:
+            self._trials = self._trial_successes = 0
+        else:
+            self._buckets.clear()
+        if self.on_state_change is not None:
+            self.on_state_change(self, old_state, state)
+
+    @property
+    def is_open(self):
+        """
+        :const:`True` if breaker rejects calls. Doesn't change state, so
+        it can be used for choosing replica.
+        """
+        if self.state == OPEN:
+            return time.time() < self._opened_at + self.open_time
+        if self.state == HALF_OPEN:
+            return self._trials >= self.half_open_calls
+        return False
+
+    def allow(self):
+        """
+        Return :const:`True` if call may be made. Every allowed call must
+        be followed by :meth:`record` or :meth:`cancel`.
+        """
+        if self.state == OPEN:
+            if time.time() < self._opened_at + self.open_time:
+                return False
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._trials >= self.half_open_calls:
+                return False
+            self._trials += 1
+        return True
+
+    def cancel(self):
+        """
+        Allowed call wasn't finished.
+        """
+        if self.state == HALF_OPEN and self._trials:
+            self._trials -= 1
+
+    def record(self, success, duration):
+        """
+        Register result of the call.
+        """
+        slow = (self.slow_call_duration is not None and
+                duration >= self.slow_call_duration)
+        if self.state == HALF_OPEN:
+            if not success or slow:
+                self._set_state(OPEN)
+            else:
+                self._trial_successes += 1
+                if self._trial_successes >= self.half_open_calls:
+                    self._set_state(CLOSED)
+            return
+        if self.state == OPEN:
+            # Call started before breaker was opened
+            return
+
+        now = time.time()
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+        if not self._buckets or \
+                self._buckets[-1][0] <= now - self._bucket_length:
+            self._buckets.append([now, 0, 0, 0])
+        bucket = self._buckets[-1]
+        bucket[1] += 1
+        bucket[2] += not success
+        bucket[3] += slow
+
+        calls = failures = slow_calls = 0
+        for _, bucket_calls, bucket_failures, bucket_slow in self._buckets:
+            calls += bucket_calls
+            failures += bucket_failures
+            slow_calls += bucket_slow
+        if calls >= self.min_calls and (
+                failures >= self.failure_rate * calls or
+                slow_calls >= self.slow_call_rate * calls):
+            self._set_state(OPEN)
@@ -0,0 +1,100 @@
+"""
+In-process cache of the responses of idempotent RPC methods.
+"""
+
+import collections
+import time
+
+__all__ = ['ResponseCache']
+
+_Entry = collections.namedtuple('_Entry', ['value', 'size', 'expires'])
+
+
+class ResponseCache(object):
+    """
+    LRU cache of the return values keyed by method name and arguments.
+    Only methods listed in *ttls* are cached. Cached values are shared
+    between callers, so they mustn't be modified.
+
+    Counters *hits*, *stale_hits*, *misses* and *evictions* are available
+    as attributes.
+
+    ::
+
+        cache = ResponseCache({'getConfig': 60.0, 'getUser': 5.0},
+                              max_entries=10000, max_bytes=64 << 20)
+        proxy = ServerProxy('http://example.com/RPC2', cache=cache)
+    """
+
+    def __init__(self, ttls, max_entries=1024, max_bytes=None,
+                 stale_while_revalidate=0.0):
+        """
+        :arg dict ttls: Time to live in seconds for each cached method
+        :arg int max_entries: Maximal number of entries
+        :arg int max_bytes: Maximal estimated size of all values in bytes,
+            :const:`None` means unlimited
+        :arg float stale_while_revalidate: How long in seconds after
+            expiration the stale value may be returned while it is being
+            refreshed in background
+        """
+        self.ttls = dict(ttls)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stale_while_revalidate = stale_while_revalidate
+        self.size = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ttl(self, name):
+        """
+        Return TTL of method *name* or :const:`None` if it isn't cached.
+        """
+        return self.ttls.get(name)
+
+    def get(self, key):
+        """
+        Return tuple *(found, value, stale)*. If *stale* is :const:`True`,
+        value has expired, but it is still in the stale-while-revalidate
+        period, so caller should refresh it.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            now = time.time()
+            if now < entry.expires:
+                self._entries[key] = entry
+                self.hits += 1
+                return True, entry.value, False
+            if now < entry.expires + self.stale_while_revalidate:
+                self._entries[key] = entry
+                self.stale_hits += 1
+                return True, entry.value, True
+            self.size -= entry.size
+        self.misses += 1
+        return False, None, False
+
+    def set(self, key, value, ttl, size):
+        """
+        Store *value* (estimated *size* in bytes) for *ttl* seconds.
+        """
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old.size
+        self._entries[key] = _Entry(value, size, time.time() + ttl)
+        self.size += size
+        while (len(self._entries) > self.max_entries or
+               (self.max_bytes is not None and self.size > self.max_bytes)):
+            entry = self._entries.popitem(last=False)[1]
+            self.size -= entry.size
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
@@ -0,0 +1,134 @@
+"""
+Compression of the request and response bodies.
+
+Request bodies larger than threshold are sent gzipped, compressed responses
+(``gzip`` or ``deflate``) are accepted and decompressed up to size limit::
+
+    proxy = ServerProxy('http://example.com/RPC2',
+                        compression=Compression(threshold=64 * 1024))
+"""
+
+import collections
+import zlib
+
+__all__ = ['Compression', 'ResponseTooLarge']
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class ResponseTooLarge(Exception):
+    """
+    Response body is larger than the limit.
+    """
+
+
+def gzip_compress(data, level):
+    # Module level function, so it can run in ProcessPoolExecutor
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress(data, wbits, max_size):
+    body = zlib.decompressobj(wbits).decompress(data, max_size + 1)
+    if len(body) > max_size:
+        raise ResponseTooLarge(
+            "Decompressed response is larger than {} bytes".format(max_size))
+    return body
+
+
+def decompress(data, encoding, max_size):
+    """
+    Decompress *data* with Content-Encoding *encoding*, raise
+    :exc:`ResponseTooLarge` if result is larger than *max_size* bytes.
+    """
+    if encoding == 'gzip':
+        return _decompress(data, 16 + zlib.MAX_WBITS, max_size)
+    if encoding == 'deflate':
+        try:
+            return _decompress(data, zlib.MAX_WBITS, max_size)
+        except zlib.error:
+            # Some servers send raw deflate data instead of zlib stream
+            return _decompress(data, -zlib.MAX_WBITS, max_size)
+    raise ValueError("Unsupported Content-Encoding '{}'".format(encoding))
+
+
+class Compression(object):
+    """
+    Gzips request bodies of at least *threshold* bytes with compression
+    *level* (1-9) and accepts compressed responses, which are decompressed
+    up to *max_size* bytes.
+
+    Counters of the bytes are kept per method, see :meth:`snapshot`.
+    """
+
+    accept_encoding = 'gzip, deflate'
+
+    def __init__(self, threshold=16 * 1024, level=6,
+                 max_size=64 * 1024 * 1024):
+        """
+        :arg int threshold: Minimal size of the compressed request body
+        :arg int level: Compression level, 1 is the fastest, 9 is the best
+        :arg int max_size: Maximal size of the decompressed response body
+        """
+        self.threshold = threshold
+        self.level = level
+        self.max_size = max_size
+        # method: [request raw, request sent, response received,
+        #          response raw]
+        self._bytes = collections.defaultdict(lambda: [0, 0, 0, 0])
+
+    def should_compress(self, size):
+        return size >= self.threshold
+
+    def compress_stream(self, name, chunks):
+        """
+        Gzip iterable of request body *chunks* of the method *name* on the
+        fly, bytes are counted when the last chunk is produced.
+        """
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED,
+                                      16 + zlib.MAX_WBITS)
+        raw = sent = 0
+        for chunk in chunks:
+            raw += len(chunk)
+            data = compressor.compress(chunk)
+            if data:
+                sent += len(data)
+                yield data
+        data = compressor.flush()
+        self.count_request(name, raw, sent + len(data))
+        yield data
+
+    def count_request(self, name, raw, sent):
+        counters = self._bytes[name]
+        counters[0] += raw
+        counters[1] += sent
+
+    def decode(self, name, body, encoding=None):
+        """
+        Return decompressed response *body* of the method *name*.
+        """
+        received = len(body)
+        if encoding and encoding != 'identity':
+            body = decompress(body, encoding.lower(), self.max_size)
+        self.count_response(name, received, len(body))
+        return body
+
+    def count_response(self, name, received, raw):
+        counters = self._bytes[name]
+        counters[2] += received
+        counters[3] += raw
+
+    def snapshot(self):
+        """
+        Return dict ``{method: {'request_raw': ..., 'request_sent': ...,
+        'response_received': ..., 'response_raw': ...}}`` with numbers of
+        bytes before compression (*raw*) and on the wire.
+        """
+        return dict(
+            (name, {
+                'request_raw': counters[0],
+                'request_sent': counters[1],
+                'response_received': counters[2],
+                'response_raw': counters[3],
+            })
+            for name, counters in self._bytes.items())
@@ -0,0 +1,243 @@
+"""
+Limiting of the number of concurrent calls of
+:class:`~tornado_fastrpc.client.ServerProxy`.
+
+:class:`ConcurrencyLimiter` has fixed limit, :class:`AdaptiveLimiter`
+adjusts the limit from observed latency and errors. Calls over the limit
+wait in a queue ordered by priority, waiting is bounded by size of the
+queue, by time and by deadline of the call.
+
+::
+
+    proxy = ServerProxy('http://example.com/RPC2',
+                        limiter=AdaptiveLimiter(max_limit=100))
+"""
+
+import heapq
+import itertools
+import math
+import time
+
+import tornado.concurrent
+import tornado.ioloop
+
+__all__ = ['AdaptiveLimiter', 'ConcurrencyLimiter', 'DeadlineExceeded',
+           'LimitExceeded']
+
+
+class LimitExceeded(Exception):
+    """
+    Call wasn't made, because limit of concurrent calls was reached and
+    call couldn't wait for a free slot.
+    """
+
+
+class DeadlineExceeded(Exception):
+    """
+    Call wasn't made, because its deadline passed before it was sent.
+    """
+
+
+class ConcurrencyLimiter(object):
+    """
+    At most *limit* concurrent calls, at most *max_queue* calls wait for
+    at most *max_wait* seconds (:const:`None` means unbounded). Waiting
+    calls with higher priority get free slot first, calls with the same
+    priority are served in FIFO order.
+
+    Attributes *limit*, *in_flight*, *queue_depth*, *rejections* and
+    *expirations* (calls dropped after their deadline) describe current
+    state.
+    """
+
+    def __init__(self, limit=10, max_queue=100, max_wait=1.0):
+        """
+        :arg int limit: Maximal number of concurrent calls
+        :arg int max_queue: Maximal number of waiting calls
+        :arg float max_wait: Maximal waiting time in seconds
+        """
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.rejections = 0
+        self.expirations = 0
+        # Heap of waiters [-priority, sequence, future, timeout]
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    @property
+    def max_limit(self):
+        return self.limit
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    def snapshot(self):
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'rejections': self.rejections,
+            'expirations': self.expirations,
+        }
+
+    def _has_slot(self):
+        return self.in_flight < max(1, int(self.limit))
+
+    def acquire(self, priority=0, deadline=None):
+        """
+        Return future which resolves when call may be made, or fails with
+        :exc:`LimitExceeded` or :exc:`DeadlineExceeded`. Every acquired
+        slot must be returned by :meth:`release`, cancelled future gets
+        no slot.
+
+        :arg int priority: Calls with higher priority are served first
+        :arg float deadline: Absolute time (:func:`time.time`) after which
+            the call mustn't be made
+        """
+        future = tornado.concurrent.Future()
+        remaining = None if deadline is None else deadline - time.time()
+        if remaining is not None and remaining <= 0:
+            self.expirations += 1
+            future.set_exception(DeadlineExceeded(
+                "Deadline passed before call was sent"))
+        elif self._has_slot() and not self._waiters:
+            self.in_flight += 1
+            future.set_result(None)
+        elif self.max_queue is not None and \
+                len(self._waiters) >= self.max_queue:
+            self.rejections += 1
+            future.set_exception(LimitExceeded("Queue of calls is full"))
+        else:
+            waiter = [-priority, next(self._sequence), future, None]
+            if self.max_wait is not None and (remaining is None or
+                                              self.max_wait < remaining):
+                waiter[3] = tornado.ioloop.IOLoop.current().call_later(
+                    self.max_wait, self._expire, waiter, False)
+            elif remaining is not None:
+                waiter[3] = tornado.ioloop.IOLoop.current().call_later(
+                    remaining, self._expire, waiter, True)
+            heapq.heappush(self._waiters, waiter)
+        return future
+
+    def _expire(self, waiter, deadline):
+        self._waiters.remove(waiter)
+        heapq.heapify(self._waiters)
+        if waiter[2].done():
+            # Caller stopped waiting, e.g. its asyncio task was cancelled
+            return
+        if deadline:
+            self.expirations += 1
+            error = DeadlineExceeded(
+                "Deadline passed while call waited for free slot")
+        else:
+            self.rejections += 1
+            error = LimitExceeded(
+                "Call waited for free slot longer than {} s".format(
+                    self.max_wait))
+        waiter[2].set_exception(error)
+
+    def release(self, latency=None, success=True):
+        """
+        Return slot. *latency* of the finished call in seconds and its
+        *success* are used for adjusting the limit, *latency* is
+        :const:`None` if call was cancelled.
+        """
+        self.in_flight -= 1
+        if latency is not None:
+            self._update(latency, success)
+        while self._waiters and self._has_slot():
+            _, _, future, timeout = heapq.heappop(self._waiters)
+            if timeout is not None:
+                tornado.ioloop.IOLoop.current().remove_timeout(timeout)
+            if future.done():
+                # Cancelled waiter doesn't get the slot
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _update(self, latency, success):
+        pass
+
+
+class AdaptiveLimiter(ConcurrencyLimiter):
+    """
+    Limiter which adjusts the limit between *min_limit* and *max_limit*.
+
+    * ``aimd`` algorithm increases limit by ``1 / limit`` after every
+      successful call while at least half of the limit is used, and
+      multiplies it by *backoff_ratio* after every failed call or call
+      slower than *latency_threshold*
+    * ``gradient`` algorithm (similar to TCP Vegas) compares short-term and
+      long-term average latency, limit shrinks when latency grows because
+      of queueing in the backend; failed calls multiply limit by
+      *backoff_ratio*
+    """
+
+    algorithms = ('aimd', 'gradient')
+
+    def __init__(self, initial_limit=10, min_limit=1, max_limit=200,
+                 algorithm='aimd', latency_threshold=None, backoff_ratio=0.9,
+                 smoothing=0.2, max_queue=100, max_wait=1.0):
+        """
+        :arg int initial_limit: Initial limit
+        :arg int min_limit: Minimal limit
+        :arg int max_limit: Maximal limit
+        :arg string algorithm: ``aimd`` or ``gradient``
+        :arg float latency_threshold: Calls slower than threshold in
+            seconds decrease limit (``aimd`` only)
+        :arg float backoff_ratio: Decrease of the limit after failure
+        :arg float smoothing: Weight of the new limit (``gradient`` only)
+        :arg int max_queue: Maximal number of waiting calls
+        :arg float max_wait: Maximal waiting time in seconds
+        """
+        if algorithm not in self.algorithms:
+            raise ValueError("Unknown algorithm '{}'".format(algorithm))
+        super(AdaptiveLimiter, self).__init__(
+            initial_limit, max_queue=max_queue, max_wait=max_wait)
+        self.min_limit = min_limit
+        self._max_limit = max_limit
+        self.algorithm = algorithm
+        self.latency_threshold = latency_threshold
+        self.backoff_ratio = backoff_ratio
+        self.smoothing = smoothing
+        self._short_rtt = None
+        self._long_rtt = None
+
+    @property
+    def max_limit(self):
+        return self._max_limit
+
+    def _set_limit(self, limit):
+        self.limit = min(self._max_limit, max(self.min_limit, limit))
+
+    def _update(self, latency, success):
+        if not success:
+            self._set_limit(self.limit * self.backoff_ratio)
+        elif self.algorithm == 'aimd':
+            self._update_aimd(latency)
+        else:
+            self._update_gradient(latency)
+
+    def _update_aimd(self, latency):
+        if self.latency_threshold is not None and \
+                latency > self.latency_threshold:
+            self._set_limit(self.limit * self.backoff_ratio)
+        elif (self.in_flight + 1) * 2 >= self.limit:
+            self._set_limit(self.limit + 1.0 / self.limit)
+
+    def _update_gradient(self, latency):
+        if self._short_rtt is None:
+            self._short_rtt = self._long_rtt = latency
+            return
+        self._short_rtt = 0.1 * latency + 0.9 * self._short_rtt
+        self._long_rtt = 0.01 * latency + 0.99 * self._long_rtt
+        if self._long_rtt > self._short_rtt * 2:
+            # Latency dropped a lot, forget old baseline
+            self._long_rtt = self._short_rtt
+        gradient = max(0.5, min(1.0, self._long_rtt / self._short_rtt))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        self._set_limit((1.0 - self.smoothing) * self.limit +
+                        self.smoothing * new_limit)
@@ -0,0 +1,74 @@
+"""
+Offloading of the marshalling of large payloads from the IOLoop thread.
+"""
+
+import time
+
+import tornado.gen
+
+__all__ = ['Offloader']
+
+
+def _timed(func, *args):
+    # Runs in the executor, must be picklable for ProcessPoolExecutor
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+
+
+class Offloader(object):
+    """
+    Runs encoding and decoding of payloads larger than *threshold* bytes
+    in *executor* (:class:`concurrent.futures.ThreadPoolExecutor` or
+    :class:`concurrent.futures.ProcessPoolExecutor`). Smaller payloads are
+    processed inline, because handing them over costs more than it saves.
+
+    Counters *encodes*, *decodes* (offloaded), *inline* (kept on loop),
+    *offloaded_bytes* and *saved_time* (seconds of the work which would
+    otherwise block the IOLoop) are available as attributes.
+    """
+
+    def __init__(self, executor, threshold=256 * 1024):
+        """
+        :arg executor: :class:`concurrent.futures.Executor` instance
+        :arg int threshold: Minimal payload size in bytes for offloading
+        """
+        self.executor = executor
+        self.threshold = threshold
+        self.encodes = 0
+        self.decodes = 0
+        self.inline = 0
+        self.offloaded_bytes = 0
+        self.saved_time = 0.0
+
+    def should_offload(self, size):
+        if size > self.threshold:
+            return True
+        self.inline += 1
+        return False
+
+    @tornado.gen.coroutine
+    def _run(self, func, *args):
+        result, elapsed = yield self.executor.submit(_timed, func, *args)
+        self.saved_time += elapsed
+        raise tornado.gen.Return(result)
+
+    @tornado.gen.coroutine
+    def encode(self, func, *args):
+        """
+        Run encoding *func* with *args* in the executor and return result.
+        """
+        self.encodes += 1
+        result = yield self._run(func, *args)
+        self.offloaded_bytes += len(result)
+        raise tornado.gen.Return(result)
+
+    @tornado.gen.coroutine
+    def decode(self, func, data):
+        """
+        Run decoding *func* of the *data* in the executor and return result.
+        """
+        self.decodes += 1
+        self.offloaded_bytes += len(data)
+        result = yield self._run(func, data)
+        raise tornado.gen.Return(result)
@@ -0,0 +1,162 @@
+"""
+Policies for sending extra requests: hedging of slow calls and retrying
+of failed calls.
+"""
+
+import random
+import socket
+
+import tornado.httpclient
+
+from tornado_fastrpc.stats import TimingAggregator
+
+__all__ = ['Budget', 'CallCancelled', 'HedgePolicy', 'RetryPolicy']
+
+
+class CallCancelled(Exception):
+    """
+    Request has been cancelled, because another request of the same call
+    has won.
+    """
+
+
+class Budget(object):
+    """
+    Token bucket which caps extra load. Every call deposits *ratio* tokens,
+    at most *max_tokens* are kept, every extra request withdraws one token.
+    E.g. ``ratio=0.1`` allows at most 10 % of extra requests.
+    """
+
+    def __init__(self, ratio=0.1, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        """
+        Withdraw one token, return :const:`False` if budget is exhausted.
+        """
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class HedgePolicy(object):
+    """
+    If call of one of the *methods* doesn't get response within delay,
+    duplicate request is sent to another replica and the first response
+    wins. Only idempotent methods may be hedged.
+
+    Delay is fixed *delay* or, if it is :const:`None`, *percentile* of
+    the method's latency observed by *timings*. Until *min_samples* calls
+    are observed, *default_delay* is used.
+
+    ::
+
+        proxy = ServerProxy(['http://a/RPC2', 'http://b/RPC2'],
+                            hedge_policy=HedgePolicy(['getData']))
+    """
+
+    def __init__(self, methods, delay=None, percentile=95,
+                 default_delay=0.05, min_delay=0.001, min_samples=100,
+                 budget=None):
+        """
+        :arg list methods: Names of hedged methods
+        :arg float delay: Fixed delay in seconds
+        :arg float percentile: Percentile of latency used as delay
+        :arg float default_delay: Delay used until latency is known
+        :arg float min_delay: Minimal delay in seconds
+        :arg int min_samples: Number of calls needed for computing delay
+        :arg budget: :class:`Budget` capping number of hedged requests,
+            default allows 10 % of extra requests
+        """
+        self.methods = frozenset(methods)
+        self.delay = delay
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.budget = budget if budget is not None else Budget()
+        self.timings = TimingAggregator()
+        self.hedged = 0
+        self.wins = 0
+
+    def applies(self, name):
+        return name in self.methods
+
+    def get_delay(self, name):
+        if self.delay is not None:
+            return self.delay
+        histogram = self.timings.histogram(name)
+        if histogram is None or histogram.count < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, histogram.percentile(self.percentile))
+
+
+class RetryPolicy(object):
+    """
+    Retries failed calls of the idempotent *methods*. Connection errors,
+    timeouts (HTTP code 599), HTTP codes *http_codes* and faults with code
+    in *fault_codes* are retried, other errors are raised immediately.
+
+    Delay before n-th retry is random in interval (0, *backoff* *
+    *multiplier* ** n), at most *max_backoff* ("full jitter"). Retry is
+    not made if it would exceed *deadline* of the whole call, or if
+    *budget* is exhausted.
+
+    ::
+
+        proxy = ServerProxy(['http://a/RPC2', 'http://b/RPC2'],
+                            retry_policy=RetryPolicy(['getData']))
+    """
+
+    def __init__(self, methods, max_attempts=3, backoff=0.01, multiplier=2.0,
+                 max_backoff=1.0, http_codes=(500, 502, 503, 504),
+                 fault_codes=(), deadline=None, budget=None):
+        """
+        :arg list methods: Names of retried methods
+        :arg int max_attempts: Maximal number of attempts including the
+            first one
+        :arg float backoff: Base of the delay in seconds
+        :arg float multiplier: Growth of the delay
+        :arg float max_backoff: Maximal delay in seconds
+        :arg list http_codes: Retried HTTP codes
+        :arg list fault_codes: Retried fault codes
+        :arg float deadline: Maximal duration of the whole call in seconds
+            including retries, default is *timeout* of the proxy
+        :arg budget: :class:`Budget` capping number of retries, default
+            allows 20 % of extra requests
+        """
+        self.methods = frozenset(methods)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.http_codes = frozenset(http_codes)
+        self.fault_codes = frozenset(fault_codes)
+        self.deadline = deadline
+        self.budget = budget if budget is not None else Budget(ratio=0.2)
+        self.retries = 0
+
+    def applies(self, name):
+        return name in self.methods
+
+    def is_retryable(self, exc):
+        fault_code = getattr(exc, 'faultCode', None)
+        if fault_code is not None:
+            return fault_code in self.fault_codes
+        if isinstance(exc, tornado.httpclient.HTTPError):
+            return exc.code == 599 or exc.code in self.http_codes
+        return isinstance(exc, (socket.error, OSError))
+
+    def get_backoff(self, attempt):
+        """
+        Return delay in seconds before retry after *attempt* (counted from
+        ``0``) failed.
+        """
+        return random.uniform(0.0, min(
+            self.max_backoff, self.backoff * self.multiplier ** attempt))
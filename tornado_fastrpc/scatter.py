@@ -0,0 +1,176 @@
+"""
+Scatter-gather calls of one method across shards.
+
+:class:`ShardedProxy` sends the call to all shards concurrently and
+returns :class:`~tornado_fastrpc.client.Result` of every shard. It doesn't
+wait for the slowest shard, if *quorum* successful results arrived or
+*deadline* passed::
+
+    shards = ShardedProxy(['http://shard1/RPC2', 'http://shard2/RPC2',
+                           'http://shard3/RPC2'], timeout=1.0)
+    results = yield shards.call_func('getItems', ids, quorum=2,
+                                     deadline=time.time() + 0.2)
+    items = [item for res in results if res.success for item in res.value]
+"""
+
+import collections
+import datetime
+import time
+
+import tornado.gen
+
+from tornado_fastrpc.client import Result, ServerProxy, _Bodies
+from tornado_fastrpc.utils import make_key
+
+__all__ = ['ShardPending', 'ShardedProxy']
+
+
+class ShardPending(Exception):
+    """
+    Shard hadn't responded when the results were gathered, because quorum
+    was reached or deadline passed.
+    """
+
+
+class ShardedProxy(object):
+    """
+    Proxy of the shards, each shard has its own
+    :class:`~tornado_fastrpc.client.ServerProxy`.
+    """
+
+    def __init__(self, shards, cache=None, **kwargs):
+        """
+        :arg list shards: URI of every shard, shard with replicas is list of
+            URIs
+        :arg cache: Callable which creates
+            :class:`~tornado_fastrpc.cache.ResponseCache` of every shard,
+            shards return different values of the same call
+        :arg kwargs: Arguments of :class:`~tornado_fastrpc.client.ServerProxy`
+            of every shard, objects like *limiter* are shared by all shards
+        """
+        self.proxies = [
+            ServerProxy(uri, cache=cache() if cache is not None else None,
+                        **kwargs)
+            for uri in shards]
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def call_func(self, name, *args, **kwargs):
+        """
+        Call RPC function *name* with the same arguments *args* on every
+        shard, see :meth:`scatter`. Arguments are serialized once.
+
+        ::
+
+            results = yield shards.call_func('getItems', ids, quorum=2)
+        """
+        return self.scatter(name, [args] * len(self.proxies), **kwargs)
+
+    @tornado.gen.coroutine
+    def scatter(self, name, shard_args, quorum=None, deadline=None,
+                priority=0, raw=False):
+        """
+        Call RPC function *name* on every shard with its arguments (tuple)
+        from *shard_args*, shards with ``None`` arguments are not called.
+        Identical arguments are serialized once, unless shard proxies cache,
+        join or batch calls.
+
+        Return list of :class:`~tornado_fastrpc.client.Result` of every
+        shard (``None`` for shards not called) as soon as *quorum*
+        successful results arrived, *deadline* (absolute time, see
+        :func:`time.time`) passed or all shards responded. Shards which
+        haven't responded yet get :exc:`ShardPending` exception, their
+        calls still run in background. *priority*, *deadline* and *raw*
+        apply to every call, see
+        :meth:`~tornado_fastrpc.client.ServerProxy.call_func`.
+
+        ::
+
+            results = yield shards.scatter('getItems', [(ids1,), (ids2,)],
+                                           deadline=time.time() + 0.2)
+        """
+        if len(shard_args) != len(self.proxies):
+            raise ValueError("Got arguments for {} shards, expected {}".format(
+                len(shard_args), len(self.proxies)))
+        bodies = self._get_bodies(name, shard_args)
+        indexes = []
+        futures = []
+        for index, (proxy, args) in enumerate(zip(self.proxies, shard_args)):
+            if args is None:
+                continue
+            body = bodies.get(make_key(name, args)) if bodies else None
+            indexes.append(index)
+            futures.append(self._call_shard(proxy, name, tuple(args), body,
+                                            priority, deadline, raw))
+
+        results = [None] * len(self.proxies)
+        successes = 0
+        wait_iterator = tornado.gen.WaitIterator(*futures)
+        while not wait_iterator.done():
+            future = wait_iterator.next()
+            if deadline is not None:
+                try:
+                    result = yield tornado.gen.with_timeout(
+                        datetime.timedelta(
+                            seconds=max(0.0, deadline - time.time())),
+                        future)
+                except tornado.gen.TimeoutError:
+                    break
+            else:
+                result = yield future
+            results[indexes[wait_iterator.current_index]] = result
+            successes += result.success
+            if quorum is not None and successes >= quorum:
+                break
+
+        reason = "Quorum was reached" if quorum is not None and \
+            successes >= quorum else "Deadline passed"
+        for index in indexes:
+            if results[index] is None:
+                results[index] = Result(False, None, ShardPending(reason))
+        raise tornado.gen.Return(results)
+
+    def _get_bodies(self, name, shard_args):
+        # Futures of the bodies of the arguments used by more shards
+        proxy = self.proxies[0] if self.proxies else None
+        if proxy is None or proxy.cache is not None or \
+                proxy._batcher is not None or proxy.single_flight:
+            # Calls mustn't bypass the cache, single flight nor batching
+            return {}
+        counts = collections.Counter(
+            make_key(name, args) for args in shard_args if args is not None)
+        bodies = {}
+        for args in shard_args:
+            if args is None:
+                continue
+            key = make_key(name, args)
+            if counts[key] > 1 and key not in bodies and \
+                    not proxy._should_stream(args):
+                bodies[key] = self._encode(proxy, name, tuple(args))
+        return bodies
+
+    @tornado.gen.coroutine
+    def _encode(self, proxy, name, args):
+        # Shard proxies have the same settings, so the body encoded by one
+        # of them can be sent by all
+        if proxy.negotiate_binary:
+            # Body of every protocol is encoded when it is needed
+            raise tornado.gen.Return((_Bodies(proxy, name, args), False))
+        body, compressed = yield proxy._encode(name, args)
+        raise tornado.gen.Return((body, compressed))
+
+    @tornado.gen.coroutine
+    def _call_shard(self, proxy, name, args, body, priority, deadline, raw):
+        # Failures are returned as results, so they don't stop gathering
+        try:
+            if body is None:
+                value = yield proxy._call(name, args, priority, deadline, raw)
+            else:
+                body, compressed = yield body
+                value = yield proxy._call_remote(name, args, priority,
+                                                 deadline, raw, body,
+                                                 compressed)
+        except Exception as e:
+            raise tornado.gen.Return(Result(False, None, e))
+        raise tornado.gen.Return(Result(True, value, None))
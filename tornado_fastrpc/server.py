@@ -0,0 +1,243 @@
+"""
+Async XML-RPC/FastRPC server based on Tornado's RequestHandler.
+
+Requests and responses are (de)serialized by the same library as
+:class:`~tornado_fastrpc.client.ServerProxy` uses, binary FastRPC requires
+``fastrpc`` library. Methods may return value, future or awaitable, calls
+of ``system.multicall`` are executed concurrently::
+
+    dispatcher = Dispatcher()
+
+    @dispatcher.register
+    @tornado.gen.coroutine
+    def getData(item_id):
+        data = yield db.get(item_id)
+        raise tornado.gen.Return(data)
+
+    @dispatcher.register(name='catalog.getItem')
+    async def get_item(item_id):
+        return await catalog.get(item_id)
+
+    app = tornado.web.Application([
+        (r'/RPC2', RpcHandler, {'dispatcher': dispatcher}),
+    ])
+"""
+
+import functools
+import inspect
+try:
+    import xmlrpc.client as xmlrpclib
+except ImportError:
+    import xmlrpclib
+
+try:
+    import fastrpc
+except ImportError:
+    fastrpc = None
+import tornado.concurrent
+import tornado.gen
+import tornado.log
+import tornado.web
+
+from tornado_fastrpc.client import (_BINARY_MAGIC, MAX_PROTOCOL_VERSION,
+                                    PARSE_ERROR_FAULT_CODE, Fault,
+                                    _dumps_response, _loads_call)
+
+try:
+    from inspect import isawaitable
+except ImportError:
+    def isawaitable(obj):
+        return False
+
+__all__ = ['Dispatcher', 'RpcHandler']
+
+# Fault codes of the XML-RPC server errors
+METHOD_NOT_FOUND_FAULT_CODE = -32601
+INTERNAL_ERROR_FAULT_CODE = -32603
+
+_FAULTS = (Fault, xmlrpclib.Fault)
+if fastrpc is not None:
+    _FAULTS += (fastrpc.Fault,)
+
+
+class Dispatcher(object):
+    """
+    Registry of the RPC methods. ``system.multicall`` is always available,
+    ``system.listMethods`` and ``system.methodHelp`` if *introspection* is
+    enabled, their results are cached.
+    """
+
+    def __init__(self, introspection=True):
+        """
+        :arg bool introspection: Register introspection methods
+        """
+        self._methods = {}
+        self._help = {}
+        self._method_list = None
+        self.add_method('system.multicall', self.multicall)
+        if introspection:
+            self.add_method('system.listMethods', self.list_methods)
+            self.add_method('system.methodHelp', self.method_help)
+
+    def add_method(self, name, func):
+        """
+        Register callable *func* as RPC method *name*.
+        """
+        self._methods[name] = func
+        self._help.pop(name, None)
+        self._method_list = None
+
+    def register(self, func=None, name=None):
+        """
+        Decorator which registers function as RPC method *name* (function
+        name by default).
+
+        ::
+
+            @dispatcher.register
+            def add(a, b):
+                return a + b
+
+            @dispatcher.register(name='math.sub')
+            def sub(a, b):
+                return a - b
+        """
+        if func is None:
+            return functools.partial(self.register, name=name)
+        self.add_method(name or func.__name__, func)
+        return func
+
+    def register_instance(self, obj, prefix=None):
+        """
+        Register public methods of the *obj*, names are prefixed by
+        *prefix* and dot.
+        """
+        for attr in dir(obj):
+            if attr.startswith('_'):
+                continue
+            func = getattr(obj, attr)
+            if callable(func):
+                self.add_method(
+                    '{}.{}'.format(prefix, attr) if prefix else attr, func)
+
+    def list_methods(self):
+        if self._method_list is None:
+            self._method_list = sorted(self._methods)
+        return self._method_list
+
+    def method_help(self, name):
+        if name not in self._help:
+            func = self._methods.get(name)
+            if func is None:
+                raise Fault(METHOD_NOT_FOUND_FAULT_CODE,
+                            "Method {} not found".format(name))
+            self._help[name] = inspect.getdoc(func) or ''
+        return self._help[name]
+
+    @tornado.gen.coroutine
+    def dispatch(self, name, params):
+        """
+        Call RPC method *name* with *params*, return future of its result.
+        Exceptions other than faults are logged and raised as
+        :exc:`~tornado_fastrpc.client.Fault`.
+        """
+        func = self._methods.get(name)
+        if func is None:
+            raise Fault(METHOD_NOT_FOUND_FAULT_CODE,
+                        "Method {} not found".format(name))
+        try:
+            result = func(*params)
+            if tornado.concurrent.is_future(result) or isawaitable(result):
+                result = yield result
+        except _FAULTS as e:
+            raise Fault(e.faultCode, e.faultString)
+        except Exception as e:
+            tornado.log.app_log.exception("Exception in method %s", name)
+            raise Fault(INTERNAL_ERROR_FAULT_CODE,
+                        "{}: {}".format(e.__class__.__name__, e))
+        raise tornado.gen.Return(result)
+
+    @tornado.gen.coroutine
+    def multicall(self, calls):
+        """
+        Execute *calls* (list of structs with *methodName* and *params*)
+        concurrently, return list of single-item lists with results or
+        fault structs.
+        """
+        results = yield [self._multicall_one(call) for call in calls]
+        raise tornado.gen.Return(results)
+
+    @tornado.gen.coroutine
+    def _multicall_one(self, call):
+        try:
+            if not isinstance(call, dict):
+                raise Fault(INTERNAL_ERROR_FAULT_CODE,
+                            "system.multicall expected struct")
+            name = call.get('methodName')
+            if name == 'system.multicall':
+                raise Fault(INTERNAL_ERROR_FAULT_CODE,
+                            "Recursive system.multicall is forbidden")
+            result = yield self.dispatch(name, call.get('params', ()))
+        except Fault as e:
+            raise tornado.gen.Return({'faultCode': e.faultCode,
+                                      'faultString': e.faultString})
+        raise tornado.gen.Return([result])
+
+
+class RpcHandler(tornado.web.RequestHandler):
+    """
+    Handler of ``text/xml`` and ``application/x-frpc`` POST requests, calls
+    are dispatched by *dispatcher*. Binary FastRPC request gets response
+    of the same protocol version (up to the newest supported one), XML-RPC
+    request gets binary response if client accepts it.
+    """
+
+    def initialize(self, dispatcher):
+        """
+        :arg dispatcher: :class:`Dispatcher` instance
+        """
+        self.dispatcher = dispatcher
+
+    def check_xsrf_cookie(self):
+        # RPC clients don't send XSRF cookies
+        pass
+
+    def get_protocol(self):
+        """
+        Return *use_binary* and protocol version of the response.
+        """
+        body = self.request.body
+        if body[:2] == _BINARY_MAGIC and len(body) >= 4:
+            return True, min(tuple(bytearray(body[2:4])),
+                             MAX_PROTOCOL_VERSION)
+        accept = self.request.headers.get('Accept', '')
+        return 'application/x-frpc' in accept, None
+
+    @tornado.gen.coroutine
+    def post(self):
+        use_binary, version = self.get_protocol()
+        name = None
+        try:
+            params, name = _loads_call(self.request.body)
+        except Exception:
+            result = Fault(PARSE_ERROR_FAULT_CODE, "Parse error")
+        else:
+            try:
+                result = yield self.dispatcher.dispatch(name, params)
+            except Fault as e:
+                result = e
+        try:
+            body = _dumps_response(result, use_binary, version)
+        except Exception as e:
+            tornado.log.app_log.exception(
+                "Can't serialize result of %s", name)
+            body = _dumps_response(
+                Fault(INTERNAL_ERROR_FAULT_CODE,
+                      "{}: {}".format(e.__class__.__name__, e)),
+                use_binary, version)
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        # Library without binary support serializes into XML
+        self.set_header('Content-Type', 'application/x-frpc'
+                        if body[:2] == _BINARY_MAGIC else 'text/xml')
+        self.finish(body)
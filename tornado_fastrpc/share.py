@@ -0,0 +1,142 @@
+"""
+Sharing of the DNS cache and TLS sessions between curl handles.
+
+Curl handles of :class:`~tornado_fastrpc.client.ServerProxy` with
+*curl_share* share one DNS cache and one cache of TLS sessions, so new
+connection neither resolves the name again (until *dns_cache_timeout*
+expires) nor makes full TLS handshake. Names can be pinned to addresses,
+so they are never resolved::
+
+    share = CurlShare(dns_cache_timeout=300,
+                      resolve={'rpc.example.com': '10.0.0.1'})
+    proxy = ServerProxy('https://rpc.example.com/RPC2', curl_share=share)
+    ...
+    share.snapshot()
+"""
+
+import collections
+import os
+
+import pycurl
+
+try:
+    import urllib.parse as urlparse
+except ImportError:
+    import urlparse
+
+__all__ = ['CurlShare']
+
+# Number of remembered connections used to recognize reused connection
+MAX_CONNECTIONS = 4096
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class CurlShare(object):
+    """
+    Curl share object with DNS cache of *dns_cache_timeout* seconds and
+    (if *ssl_sessions*) shared TLS sessions. *resolve* is dict which pins
+    host (``'host'`` or ``'host:port'``) to IP address.
+
+    It counts requests, new connections and DNS resolutions, see
+    :meth:`snapshot`. The share object is created again after fork.
+    """
+
+    def __init__(self, dns_cache_timeout=60, resolve=None, ssl_sessions=True):
+        """
+        :arg int dns_cache_timeout: Lifetime of DNS cache entries in
+            seconds, ``-1`` caches forever
+        :arg dict resolve: Map of the host (optionally with port) to IP
+            address
+        :arg bool ssl_sessions: Share TLS sessions
+        """
+        self.dns_cache_timeout = dns_cache_timeout
+        self.resolve = dict(resolve or {})
+        self.ssl_sessions = ssl_sessions
+        self.requests = 0
+        self.connections = 0
+        self.resolutions = 0
+        self._share = None
+        self._pid = None
+        # (remote address, remote port, local address, local port) of the
+        # recently used connections
+        self._known = collections.OrderedDict()
+
+    @property
+    def share(self):
+        # Sessions mustn't be resumed by both parent and child process
+        pid = os.getpid()
+        if self._share is None or self._pid != pid:
+            self._share = pycurl.CurlShare()
+            self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+            if self.ssl_sessions:
+                self._share.setopt(pycurl.SH_SHARE,
+                                   pycurl.LOCK_DATA_SSL_SESSION)
+            self._pid = pid
+            self._known.clear()
+        return self._share
+
+    def get_resolve(self, uris):
+        """
+        Return list of curl's ``RESOLVE`` entries (``host:port:address``)
+        of pinned hosts of *uris*.
+        """
+        entries = []
+        for uri in uris:
+            parsed = urlparse.urlparse(uri)
+            port = parsed.port or _DEFAULT_PORTS.get(parsed.scheme, 80)
+            address = self.resolve.get(
+                '{}:{}'.format(parsed.hostname, port),
+                self.resolve.get(parsed.hostname))
+            if address is None:
+                continue
+            entry = '{}:{}:{}'.format(parsed.hostname, port, address)
+            if entry not in entries:
+                entries.append(entry)
+        return entries
+
+    def setup(self, c, resolve=()):
+        """
+        Attach curl handle *c* to the share object, *resolve* is list of
+        pinned hosts returned by :meth:`get_resolve`.
+        """
+        # Handles are reused by the HTTP client and can be attached to the
+        # share object created before fork
+        c.unsetopt(pycurl.SHARE)
+        c.setopt(pycurl.SHARE, self.share)
+        c.setopt(pycurl.DNS_CACHE_TIMEOUT, self.dns_cache_timeout)
+        c.setopt(pycurl.RESOLVE, list(resolve))
+        c.setopt(pycurl.RESOLVER_START_FUNCTION, self._on_resolve)
+        c.setopt(pycurl.PREREQFUNCTION, self._on_connected)
+
+    def _on_resolve(self, *args):
+        # Called only if name isn't in DNS cache nor pinned
+        self.resolutions += 1
+        return 0
+
+    def _on_connected(self, remote_ip, local_ip, remote_port, local_port):
+        # Called before request is sent over new or reused connection
+        self.requests += 1
+        key = (remote_ip, remote_port, local_ip, local_port)
+        if self._known.pop(key, None) is None:
+            self.connections += 1
+        self._known[key] = True
+        if len(self._known) > MAX_CONNECTIONS:
+            self._known.popitem(last=False)
+        return pycurl.PREREQFUNC_OK
+
+    def snapshot(self):
+        """
+        Return dict with numbers of sent *requests*, new *connections*, DNS
+        *resolutions*, TCP and TLS *handshakes_saved* by reused
+        connections and *resolutions_avoided* by DNS cache, pinned hosts
+        and reused connections. New connections resume shared TLS
+        sessions, but libcurl doesn't report abbreviated handshakes.
+        """
+        return {
+            'requests': self.requests,
+            'connections': self.connections,
+            'resolutions': self.resolutions,
+            'handshakes_saved': max(0, self.requests - self.connections),
+            'resolutions_avoided': max(0, self.requests - self.resolutions),
+        }
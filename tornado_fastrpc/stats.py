@@ -0,0 +1,193 @@
+"""
+Timing of the RPC calls.
+
+:class:`~tornado_fastrpc.client.ServerProxy` passes :class:`CallTiming` of
+every call to its observers. :class:`TimingAggregator` is an observer
+which keeps per-method latency histograms::
+
+    timings = TimingAggregator()
+    proxy = ServerProxy('http://example.com/RPC2', observers=[timings])
+    ...
+    timings.histogram('getData', 'total').percentile(99)
+"""
+
+import collections
+import math
+
+__all__ = ['CallTiming', 'LatencyHistogram', 'TimingAggregator']
+
+
+class CallTiming(object):
+    """
+    Timing record of one call. All durations are in seconds.
+
+    * *method* called RPC method
+    * *uri* URI of the replica
+    * *exception* instance of the exception if call failed, else
+      :const:`None`
+    * *serialize* encoding of the request body
+    * *queue* waiting for a free slot of the proxy's limiter
+    * *fetch* HTTP request, including waiting for a free connection
+    * *parse* decoding of the response, :const:`None` if no response
+    * *total* whole call
+    * *time_info* dict with timings reported by the HTTP client (curl's
+      ``queue``, ``namelookup``, ``connect``, ``appconnect``,
+      ``pretransfer``, ``starttransfer`` and ``total``), see
+      :attr:`tornado.httpclient.HTTPResponse.time_info`
+    """
+
+    def __init__(self, method, uri, exception, serialize, fetch, parse,
+                 total, time_info, queue=0.0):
+        self.method = method
+        self.uri = uri
+        self.exception = exception
+        self.serialize = serialize
+        self.queue = queue
+        self.fetch = fetch
+        self.parse = parse
+        self.total = total
+        self.time_info = time_info
+
+    @property
+    def success(self):
+        return self.exception is None
+
+    @property
+    def phases(self):
+        """
+        Dict of the durations of the call phases. Phases reported by the
+        HTTP client are present only if the client measures them:
+
+        * *serialize* encoding of the request body
+        * *queue* waiting for a free slot of the proxy and for a free
+          connection in the HTTP client
+        * *dns* name resolution
+        * *connect* TCP handshake
+        * *tls* TLS handshake
+        * *ttfb* time from sending request to the first byte of response,
+          i.e. mostly server time
+        * *transfer* receiving of the response body
+        * *parse* decoding of the response
+        * *total* whole call
+        """
+        phases = {'serialize': self.serialize, 'total': self.total}
+        if self.parse is not None:
+            phases['parse'] = self.parse
+        info = self.time_info
+        if self.queue or 'queue' in info:
+            phases['queue'] = self.queue + info.get('queue', 0.0)
+        if 'namelookup' in info:
+            phases['dns'] = info['namelookup']
+            phases['connect'] = max(0.0, info['connect'] - info['namelookup'])
+            if info.get('appconnect'):
+                phases['tls'] = max(0.0, info['appconnect'] - info['connect'])
+        if 'starttransfer' in info:
+            phases['ttfb'] = max(
+                0.0, info['starttransfer'] - info.get('pretransfer', 0.0))
+            phases['transfer'] = max(
+                0.0, info['total'] - info['starttransfer'])
+        return phases
+
+    def __repr__(self):
+        return "<{} {} {} total={:.6f}>".format(
+            self.__class__.__name__, self.method, self.uri, self.total)
+
+
+class LatencyHistogram(object):
+    """
+    Histogram with logarithmic buckets, relative error of the percentiles
+    is at most *precision*. Values lower than *min_value* seconds fall into
+    the first bucket.
+    """
+
+    def __init__(self, precision=0.05, min_value=1e-6):
+        self.min_value = min_value
+        self._log_base = math.log(1.0 + precision)
+        self._buckets = collections.defaultdict(int)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        if value > self.min_value:
+            index = int(math.log(value / self.min_value) / self._log_base)
+        else:
+            index = 0
+        self._buckets[index] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def percentile(self, p):
+        """
+        Return *p*-th percentile (0-100) or :const:`None` if histogram
+        is empty.
+        """
+        if not self.count:
+            return None
+        rank = p / 100.0 * self.count
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                # Upper bound of the bucket
+                value = self.min_value * math.exp(
+                    (index + 1) * self._log_base)
+                return min(value, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+        }
+
+
+class TimingAggregator(object):
+    """
+    Observer which keeps :class:`LatencyHistogram` of every phase of the
+    calls, see :attr:`CallTiming.phases`, per method. Failed calls are
+    counted in *errors*, their timing is not recorded.
+    """
+
+    def __init__(self, precision=0.05):
+        self.precision = precision
+        self.errors = collections.defaultdict(int)
+        self._histograms = collections.defaultdict(dict)
+
+    def __call__(self, timing):
+        if not timing.success:
+            self.errors[timing.method] += 1
+            return
+        histograms = self._histograms[timing.method]
+        for phase, value in timing.phases.items():
+            histogram = histograms.get(phase)
+            if histogram is None:
+                histogram = histograms[phase] = LatencyHistogram(
+                    self.precision)
+            histogram.add(value)
+
+    def histogram(self, method, phase='total'):
+        """
+        Return histogram of the *phase* of the *method* or :const:`None`.
+        """
+        return self._histograms.get(method, {}).get(phase)
+
+    def snapshot(self):
+        """
+        Return dict ``{method: {phase: {'count': ..., 'p50': ..., ...}}}``.
+        """
+        return dict(
+            (method, dict((phase, h.snapshot())
+                          for phase, h in histograms.items()))
+            for method, histograms in self._histograms.items())
@@ -0,0 +1,316 @@
+"""
+Incremental encoding of the requests and decoding of the responses.
+
+:class:`RequestBody` produces XML-RPC request body chunk by chunk while it
+is sent, so large arguments (lists, iterators, file-like objects,
+:class:`memoryview`) are never marshalled as a whole.
+:class:`StreamingDecoder` receives the response body chunk by chunk from
+``streaming_callback`` of the HTTP request, so the raw body isn't kept
+in memory together with the decoded value.
+"""
+
+import base64
+import zlib
+try:
+    import xmlrpc.client as xmlrpclib
+except ImportError:
+    import xmlrpclib
+
+import tornado.gen
+
+from tornado_fastrpc.compression import GZIP_MAGIC, ResponseTooLarge
+
+__all__ = ['RequestBody', 'StreamingDecoder', 'is_streamable',
+           'iter_dumps']
+
+# Approximate size of the chunks of the request body
+CHUNK_SIZE = 64 * 1024
+
+# Binary data is read in blocks of multiple of 3 bytes, so base64 encoded
+# blocks can be concatenated
+BINARY_BLOCK_SIZE = 48 * 1024
+
+_PARAM_PREFIX = '<params>\n<param>\n'
+_PARAM_SUFFIX = '</param>\n</params>\n'
+
+
+def _is_file(value):
+    return hasattr(value, 'read')
+
+
+def _is_iterator(value):
+    return hasattr(value, '__next__') or hasattr(value, 'next')
+
+
+def is_streamable(args):
+    """
+    Return :const:`True` if *args* contain iterator, file-like object or
+    :class:`memoryview`, which can be marshalled only incrementally.
+    """
+    stack = list(args)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, memoryview) or _is_file(value) or \
+                _is_iterator(value):
+            return True
+    return False
+
+
+def _iter_binary(value):
+    yield '<value><base64>\n'
+    if isinstance(value, memoryview):
+        value = value.cast('B') if value.ndim != 1 or \
+            value.format != 'B' else value
+        for i in range(0, len(value), BINARY_BLOCK_SIZE):
+            yield base64.b64encode(
+                value[i:i + BINARY_BLOCK_SIZE]).decode('ascii') + '\n'
+    else:
+        while True:
+            block = value.read(BINARY_BLOCK_SIZE)
+            if not block:
+                break
+            # read() may return fewer bytes, keep blocks aligned
+            while len(block) % 3:
+                more = value.read(3 - len(block) % 3)
+                if not more:
+                    break
+                block += more
+            yield base64.b64encode(block).decode('ascii') + '\n'
+    yield '</base64></value>\n'
+
+
+def _iter_value(value, marshaller):
+    if isinstance(value, (list, tuple)) or (
+            _is_iterator(value) and not _is_file(value)):
+        yield '<value><array><data>\n'
+        for item in value:
+            for piece in _iter_value(item, marshaller):
+                yield piece
+        yield '</data></array></value>\n'
+    elif isinstance(value, dict):
+        yield '<value><struct>\n'
+        for key, item in value.items():
+            yield '<member>\n<name>{}</name>\n'.format(
+                xmlrpclib.escape(key))
+            for piece in _iter_value(item, marshaller):
+                yield piece
+            yield '</member>\n'
+        yield '</struct></value>\n'
+    elif isinstance(value, memoryview) or _is_file(value):
+        for piece in _iter_binary(value):
+            yield piece
+    else:
+        yield marshaller.dumps((value,))[
+            len(_PARAM_PREFIX):-len(_PARAM_SUFFIX)]
+
+
+def iter_dumps(args, name, chunk_size=CHUNK_SIZE):
+    """
+    Generate XML-RPC call of the method *name* with arguments *args* in
+    chunks of at least *chunk_size* bytes (except the last one).
+    Iterators are marshalled as arrays, file-like objects (opened in
+    binary mode) and :class:`memoryview` as binary data.
+    """
+    marshaller = xmlrpclib.Marshaller('utf-8', allow_none=True)
+    pieces = ["<?xml version='1.0'?>\n<methodCall>\n<methodName>{}"
+              "</methodName>\n<params>\n".format(name)]
+    size = 0
+    for arg in args:
+        pieces.append('<param>\n')
+        for piece in _iter_value(arg, marshaller):
+            pieces.append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                yield ''.join(pieces).encode('utf-8')
+                pieces = []
+                size = 0
+        pieces.append('</param>\n')
+    pieces.append('</params>\n</methodCall>\n')
+    yield ''.join(pieces).encode('utf-8')
+
+
+class RequestBody(object):
+    """
+    Request body produced from iterable of *chunks*. It can be read by
+    curl's ``READFUNCTION`` (:meth:`read`) or used as ``body_producer``
+    of the request (:meth:`produce`), but only once. *size* is number of
+    bytes produced so far.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+        self.size = 0
+
+    def read(self, size):
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self.size += len(data)
+        return data
+
+    @tornado.gen.coroutine
+    def produce(self, write):
+        for chunk in self._chunks:
+            self.size += len(chunk)
+            yield write(chunk)
+
+
+class StreamingDecoder(object):
+    """
+    Decoder of one response. XML-RPC body is fed into the expat parser as
+    it arrives. FastRPC binary body is collected and decoded by *loads*
+    at the end, because FastRPC library has no incremental decoder.
+
+    Body compressed with ``gzip`` or ``deflate`` is decompressed on the
+    fly, compressed body is recognized also when ``Content-Encoding``
+    header hasn't arrived before the body. When decoded body exceeds
+    *max_size* bytes, :meth:`feed` raises
+    :exc:`~tornado_fastrpc.compression.ResponseTooLarge`, so the HTTP
+    client aborts the transfer, and :meth:`close` raises it again.
+
+    *received* and *size* are numbers of bytes received and decoded.
+    """
+
+    def __init__(self, loads, max_size=None):
+        """
+        :arg loads: Function which decodes whole binary body
+        :arg int max_size: Maximal size of the decoded body in bytes
+        """
+        self.loads = loads
+        self.max_size = max_size
+        self.received = 0
+        self.size = 0
+        self.error = None
+        self._started = False
+        self._content_type = ''
+        self._encoding = None
+        self._decompressor = None
+        self._parser = None
+        self._unmarshaller = None
+        self._chunks = None
+
+    def on_header(self, line):
+        """
+        ``header_callback`` of the HTTP request.
+        """
+        if line.startswith('HTTP/'):
+            # Headers of the interim response (100 Continue) are dropped
+            self._content_type = ''
+            self._encoding = None
+            return
+        name, _, value = line.partition(':')
+        name = name.strip().lower()
+        if name == 'content-type':
+            self._content_type = value.strip().lower()
+        elif name == 'content-encoding':
+            value = value.strip().lower()
+            if value != 'identity':
+                self._encoding = value
+
+    def _start(self, data):
+        self._started = True
+        if self._encoding is None:
+            # Neither XML nor FastRPC body starts with gzip magic or zlib
+            # header
+            header = bytearray(data[:2])
+            if data[:2] == GZIP_MAGIC:
+                self._encoding = 'gzip'
+            elif len(header) == 2 and header[0] == 0x78 and \
+                    (header[0] * 256 + header[1]) % 31 == 0:
+                self._encoding = 'deflate'
+        if self._encoding == 'gzip':
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self._encoding == 'deflate':
+            # Some servers send raw deflate data instead of zlib stream
+            header = bytearray(data[:2])
+            raw = len(header) < 2 or (header[0] & 0x0f) != zlib.DEFLATED or \
+                (header[0] * 256 + header[1]) % 31
+            self._decompressor = zlib.decompressobj(
+                -zlib.MAX_WBITS if raw else zlib.MAX_WBITS)
+        elif self._encoding is not None:
+            raise ValueError(
+                "Unsupported Content-Encoding '{}'".format(self._encoding))
+
+    def _select_parser(self, data):
+        if 'frpc' in self._content_type or data[:2] == b'\xca\x11':
+            self._chunks = []
+        else:
+            self._parser, self._unmarshaller = xmlrpclib.getparser()
+
+    def _decompress(self, data, flush=False):
+        if self._decompressor is None:
+            return data
+        if self.max_size is None:
+            return self._decompressor.flush() if flush else \
+                self._decompressor.decompress(data)
+        # Output is bounded, so compressed bomb doesn't exhaust memory
+        limit = self.max_size - self.size + 1
+        if flush:
+            return self._decompressor.flush(limit)
+        return self._decompressor.decompress(data, limit)
+
+    def _process(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise ResponseTooLarge(
+                "Response is larger than {} bytes".format(self.max_size))
+        if self._parser is None and self._chunks is None:
+            self._select_parser(data)
+        if self._chunks is not None:
+            self._chunks.append(data)
+        elif data:
+            self._parser.feed(data)
+
+    def feed(self, chunk):
+        """
+        ``streaming_callback`` of the HTTP request. It raises error of the
+        body which can't be decoded, so the HTTP client aborts the
+        transfer, see :meth:`write`.
+        """
+        if not self.write(chunk):
+            raise self.error
+
+    def write(self, chunk):
+        """
+        Decode *chunk* of the body. It never raises, it returns
+        :const:`False` if the body can't be decoded (error is raised by
+        :meth:`close`) and rest of the body is dropped.
+        """
+        self.received += len(chunk)
+        if self.error is not None or not chunk:
+            return self.error is None
+        try:
+            if not self._started:
+                self._start(chunk)
+            data = self._decompress(chunk)
+            if data:
+                self._process(data)
+        except Exception as e:
+            # Rest of the body is dropped
+            self.error = e
+            self._parser = self._chunks = None
+            return False
+        return True
+
+    def close(self):
+        """
+        Return decoded value, raise fault or decoding error.
+        """
+        if self.error is not None:
+            raise self.error
+        if not self._started:
+            self._start(b'')
+        self._process(self._decompress(b'', flush=True))
+        if self._chunks is not None:
+            data, self._chunks = b''.join(self._chunks), None
+            return self.loads(data)
+        self._parser.close()
+        return self._unmarshaller.close()[0]
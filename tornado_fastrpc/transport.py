@@ -0,0 +1,379 @@
+"""
+Pure :mod:`asyncio` HTTP/1.1 transport with pool of persistent connections.
+
+It doesn't require **pycurl** and it keeps bounded number of keep-alive
+connections per host, so calls don't pay for TCP (and TLS) handshake. It
+requires Python 3.5+ and Tornado 5+ (Tornado running on asyncio).
+
+::
+
+    proxy = ServerProxy('http://example.com/RPC2',
+                        http_client_cls=AsyncioHTTPClient)
+"""
+
+import asyncio
+import collections
+import io
+import ssl
+import time
+import urllib.parse as urlparse
+
+import tornado.httpclient
+import tornado.httputil
+
+__all__ = ['AsyncioHTTPClient']
+
+# Body up to this size is sent in the same write as the headers
+SMALL_BODY_SIZE = 64 * 1024
+
+# Size of the chunks passed to streaming_callback
+CHUNK_SIZE = 64 * 1024
+
+# Headers which are handled by the transport itself
+_SKIP_HEADERS = frozenset(['expect', 'content-length', 'transfer-encoding'])
+
+
+class _Connection(object):
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.time()
+
+    @property
+    def closed(self):
+        return self.reader.at_eof() or self.writer.is_closing()
+
+    def close(self):
+        self.writer.close()
+
+
+class _HostPool(object):
+    """
+    Keep-alive connections to one host, at most *max_size* connections
+    are open (idle or busy). Connections idle for *idle_timeout* seconds
+    are closed, even if the host isn't called any more.
+    """
+
+    def __init__(self, max_size, idle_timeout):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.size = 0
+        self.idle = collections.deque()
+        self.waiters = collections.deque()
+        self._sweep_handle = None
+
+    def _evict_idle(self):
+        deadline = time.time() - self.idle_timeout
+        while self.idle and self.idle[0].last_used < deadline:
+            self.idle.popleft().close()
+            self.size -= 1
+
+    def _schedule_sweep(self):
+        if self._sweep_handle is None and self.idle:
+            # The oldest idle connection expires first
+            delay = self.idle[0].last_used + self.idle_timeout - time.time()
+            self._sweep_handle = asyncio.get_event_loop().call_later(
+                max(0.0, delay), self._sweep)
+
+    def _sweep(self):
+        self._sweep_handle = None
+        self._evict_idle()
+        self._schedule_sweep()
+
+    async def acquire(self, connect):
+        """
+        Return tuple *(connection, reused)*. New connection is opened by
+        *connect* coroutine function.
+        """
+        while True:
+            self._evict_idle()
+            while self.idle:
+                # LIFO, recently used connection is most likely alive
+                conn = self.idle.pop()
+                if not conn.closed:
+                    return conn, True
+                conn.close()
+                self.size -= 1
+            if self.size < self.max_size:
+                self.size += 1
+                try:
+                    conn = await connect()
+                except BaseException:
+                    self.size -= 1
+                    self._wake()
+                    raise
+                return conn, False
+            waiter = asyncio.get_event_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Pass the wake up to another waiter
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+
+    def release(self, conn, reusable):
+        self._evict_idle()
+        if reusable and not conn.closed:
+            conn.last_used = time.time()
+            self.idle.append(conn)
+            self._schedule_sweep()
+        else:
+            conn.close()
+            self.size -= 1
+        self._wake()
+
+    def _wake(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def close(self):
+        if self._sweep_handle is not None:
+            self._sweep_handle.cancel()
+            self._sweep_handle = None
+        while self.idle:
+            self.idle.pop().close()
+            self.size -= 1
+
+
+class _StaleConnection(Exception):
+    # Reused connection was closed by the server before response
+    pass
+
+
+class AsyncioHTTPClient(object):
+    """
+    HTTP client compatible with the part of the
+    :class:`tornado.httpclient.AsyncHTTPClient` interface used by
+    :class:`~tornado_fastrpc.client.ServerProxy`. Only ``POST`` requests
+    with body are supported, proxy settings and ``prepare_curl_callback``
+    are ignored. ``header_callback`` receives headers of the final
+    response only. Body of the request with ``body_producer`` is sent with
+    chunked transfer encoding. Request with ``unix_socket`` attribute is
+    sent over Unix socket of that path. Exception raised by
+    ``streaming_callback`` aborts the transfer.
+    """
+
+    def __init__(self, max_clients=10, idle_timeout=30.0):
+        """
+        :arg int max_clients: Maximal number of connections per host
+        :arg float idle_timeout: Idle connection is closed after
+            *idle_timeout* seconds
+        """
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self._pools = {}
+        self._ssl_context = None
+
+    def _get_pool(self, key):
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _HostPool(
+                self.max_clients, self.idle_timeout)
+        return pool
+
+    def _get_ssl_context(self, request):
+        if not request.validate_cert:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            return context
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context(
+                cafile=request.ca_certs)
+        return self._ssl_context
+
+    def fetch(self, request):
+        """
+        Execute *request*, return future which resolves into the
+        :class:`tornado.httpclient.HTTPResponse`. Raises
+        :exc:`tornado.httpclient.HTTPError` if the response code isn't 2xx,
+        or with code 599 for connection errors and timeouts.
+        """
+        return asyncio.ensure_future(self._fetch(request))
+
+    async def _fetch(self, request):
+        start = time.time()
+        try:
+            return await asyncio.wait_for(
+                self._fetch_with_retry(request, start),
+                request.request_timeout or None)
+        except asyncio.TimeoutError:
+            raise tornado.httpclient.HTTPError(599, "Timeout")
+        except (OSError, asyncio.IncompleteReadError, ValueError,
+                _StaleConnection) as e:
+            raise tornado.httpclient.HTTPError(599, str(e))
+
+    async def _fetch_with_retry(self, request, start):
+        url = urlparse.urlsplit(request.url)
+        secure = url.scheme == 'https'
+        port = url.port or (443 if secure else 80)
+        unix_socket = getattr(request, 'unix_socket', None)
+        pool = self._get_pool((url.scheme, url.hostname, port, unix_socket))
+
+        async def connect():
+            context = self._get_ssl_context(request) if secure else None
+            if unix_socket is not None:
+                opening = asyncio.open_unix_connection(
+                    unix_socket, ssl=context,
+                    server_hostname=url.hostname if secure else None)
+            else:
+                opening = asyncio.open_connection(
+                    url.hostname, port, ssl=context)
+            return _Connection(*await asyncio.wait_for(
+                opening, request.connect_timeout or None))
+
+        while True:
+            conn, reused = await pool.acquire(connect)
+            connected = time.time()
+            reusable = False
+            try:
+                response, reusable = await self._send(
+                    conn, url, request, start, connected)
+            except _StaleConnection:
+                # Server closed idle connection, it's safe to try again
+                # with new one, because nothing was received. Produced
+                # body can't be sent again.
+                if not reused or request.body_producer is not None:
+                    raise
+                continue
+            finally:
+                pool.release(conn, reusable)
+            if response.error:
+                raise response.error
+            return response
+
+    def _get_head(self, url, request):
+        path = url.path or '/'
+        if url.query:
+            path += '?' + url.query
+        lines = ['{} {} HTTP/1.1'.format(request.method, path)]
+        headers = request.headers
+        if 'Host' not in headers:
+            lines.append('Host: {}'.format(url.netloc))
+        for name, value in headers.items():
+            if value and name.lower() not in _SKIP_HEADERS:
+                lines.append('{}: {}'.format(name, value))
+        if request.body_producer is not None:
+            lines.append('Transfer-Encoding: chunked')
+        else:
+            lines.append('Content-Length: {}'.format(
+                len(request.body or b'')))
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin1')
+
+    async def _send(self, conn, url, request, start, connected):
+        head = self._get_head(url, request)
+        body = request.body or b''
+        reader = conn.reader
+        try:
+            if request.body_producer is not None:
+                conn.writer.write(head)
+                await request.body_producer(
+                    lambda chunk: self._write_chunk(conn.writer, chunk))
+                conn.writer.write(b'0\r\n\r\n')
+            elif len(body) <= SMALL_BODY_SIZE:
+                conn.writer.write(head + body)
+            else:
+                conn.writer.write(head)
+                conn.writer.write(body)
+            await conn.writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                raise _StaleConnection("Connection closed by server")
+            raise
+        except ConnectionError as e:
+            raise _StaleConnection(str(e))
+        first_byte = time.time()
+        version, code, reason, headers = self._parse_head(head)
+        # Skip interim responses, e.g. 100 Continue
+        while code < 200:
+            head = await reader.readuntil(b'\r\n\r\n')
+            version, code, reason, headers = self._parse_head(head)
+        if request.header_callback is not None:
+            for line in head.decode('latin1').split('\r\n')[:-1]:
+                request.header_callback(line + '\r\n')
+
+        if code in (204, 304):
+            body, complete = b'', True
+        else:
+            body, complete = await self._read_body(
+                reader, headers, request.streaming_callback)
+        connection = headers.get('Connection', '').lower()
+        if version == 'HTTP/1.0':
+            reusable = complete and connection == 'keep-alive'
+        else:
+            reusable = complete and connection != 'close'
+
+        end = time.time()
+        response = tornado.httpclient.HTTPResponse(
+            request, code, headers=headers, buffer=io.BytesIO(body),
+            effective_url=request.url, reason=reason,
+            request_time=end - start,
+            time_info={
+                'queue': connected - start,
+                'starttransfer': first_byte - start,
+                'total': end - start,
+            })
+        return response, reusable
+
+    def _write_chunk(self, writer, chunk):
+        if chunk:
+            writer.write(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+        return asyncio.ensure_future(writer.drain())
+
+    def _parse_head(self, head):
+        status_line, _, header_data = head.partition(b'\r\n')
+        parts = status_line.decode('latin1').split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise ValueError(
+                "Malformed HTTP status line {!r}".format(status_line))
+        headers = tornado.httputil.HTTPHeaders.parse(
+            header_data.decode('latin1'))
+        reason = parts[2] if len(parts) > 2 else ''
+        return parts[0], int(parts[1]), reason, headers
+
+    async def _read_body(self, reader, headers, streaming_callback=None):
+        """
+        Return tuple *(body, complete)*. If *complete* is :const:`False`,
+        body has been read until connection was closed. If
+        *streaming_callback* is given, it receives the body in chunks and
+        returned body is empty.
+        """
+        chunks = []
+        write = streaming_callback or chunks.append
+        if headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                size_line = await reader.readuntil(b'\r\n')
+                size = int(size_line.split(b';', 1)[0], 16)
+                if size == 0:
+                    # Skip trailers
+                    while (await reader.readuntil(b'\r\n')) != b'\r\n':
+                        pass
+                    return b''.join(chunks), True
+                write(await reader.readexactly(size))
+                await reader.readexactly(2)
+        if 'Content-Length' in headers:
+            size = int(headers['Content-Length'])
+            if streaming_callback is None:
+                return await reader.readexactly(size), True
+            while size:
+                chunk = await reader.readexactly(min(size, CHUNK_SIZE))
+                size -= len(chunk)
+                write(chunk)
+            return b'', True
+        while True:
+            chunk = await reader.read(CHUNK_SIZE)
+            if not chunk:
+                return b''.join(chunks), False
+            write(chunk)
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
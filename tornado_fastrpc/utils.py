@@ -0,0 +1,70 @@
+"""
+Helpers shared by the client's components.
+"""
+
+import datetime
+try:
+    import xmlrpc.client as xmlrpclib
+except ImportError:
+    import xmlrpclib
+
+__all__ = ['estimate_size', 'make_key']
+
+_SCALAR_TYPES = (bool, int, float, type(None), bytes, type(u''),
+                 datetime.datetime)
+try:
+    _SCALAR_TYPES += (long,)
+except NameError:
+    pass
+
+
+def _canonical(value):
+    if isinstance(value, _SCALAR_TYPES):
+        # Type is part of the key, because True == 1 == 1.0 in Python,
+        # but not in RPC.
+        return (value.__class__, value)
+    if isinstance(value, (list, tuple)):
+        return (list, tuple(_canonical(i) for i in value))
+    if isinstance(value, dict):
+        return (dict, tuple(sorted(
+            (k, _canonical(v)) for k, v in value.items())))
+    if isinstance(value, xmlrpclib.Binary):
+        return (bytes, value.data)
+    return (value.__class__, repr(value))
+
+
+def make_key(name, args):
+    """
+    Return hashable key of the call of method *name* with arguments *args*.
+    Equal calls have equal keys regardless of dict ordering or of using
+    list instead of tuple.
+    """
+    return (name, _canonical(args))
+
+
+def estimate_size(value, limit=None):
+    """
+    Return approximate size of the marshalled *value* in bytes. Stop
+    counting when the size exceeds *limit*.
+    """
+    size = 0
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (bytes, type(u''))):
+            size += len(value) + 8
+        elif isinstance(value, (list, tuple)):
+            size += 8
+            stack.extend(value)
+        elif isinstance(value, dict):
+            size += 8
+            for k, v in value.items():
+                size += len(k) + 8
+                stack.append(v)
+        elif isinstance(value, xmlrpclib.Binary):
+            size += len(value.data) + 8
+        else:
+            size += 16
+        if limit is not None and size > limit:
+            break
+    return size